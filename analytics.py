@@ -0,0 +1,326 @@
+# analytics.py
+
+"""
+Estatísticas por campeão sobre todas as partidas do banco, em colunas NumPy na memória.
+
+As partidas são carregadas uma vez; depois, a cada consulta, sync() relê só
+as partidas dos jogadores gravados desde o último write_seq visto (de
+qualquer processo: outros workers, ingest.py), sem recarregar o banco todo.
+"""
+
+import hashlib
+import threading
+
+from database import changed_player_keys, iter_changed_matches, iter_matches, last_write_seq, player_key
+
+try:
+    import numpy as np
+except ImportError:  # só é necessário para /stats/champions
+    np = None
+
+PERCENTILES = (50, 90)
+
+
+def _hash(text):
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _row_key(row):
+    """Identidade de uma linha (partida + conta) em 64 bits, para não contar a mesma linha duas vezes."""
+    return _hash(f"{row[0]}|{player_key(row)}")
+
+
+class _Columns:
+    """Colunas com capacidade que dobra ao encher e índice chave da linha -> posição.
+
+    O índice é um array ordenado (busca com searchsorted) mais um dict com as
+    chaves recentes, reordenado quando o dict passa de 1/8 do array: acrescentar
+    k linhas custa O(k) amortizado, sem copiar as colunas a cada gravação.
+    """
+
+    DTYPES = (
+        # int16: o argsort estável de inteiros de 16 bits é um radix sort
+        ("champion", "int16"),
+        ("kills", "int32"),
+        ("deaths", "int32"),
+        ("assists", "int32"),
+        ("win", "bool"),
+        ("gameCreation", "int64"),
+        ("gameDuration", "int32"),
+        ("doubleKills", "int32"),
+        ("tripleKills", "int32"),
+        ("goldEarned", "int32"),
+        ("key", "int64"),
+        ("player", "int64"),
+        ("alive", "bool"),
+    )
+
+    def __init__(self):
+        self.champions = {}
+        self.names = []
+        self.size = 0
+        self.dead = 0
+        self.data = {name: np.empty(0, dtype=dtype) for name, dtype in self.DTYPES}
+        self.sorted_keys = np.empty(0, dtype=np.int64)
+        self.sorted_rows = np.empty(0, dtype=np.int64)
+        self.recent = {}
+
+    def view(self, name):
+        return self.data[name][:self.size]
+
+    def _to_columns(self, rows, keys=None):
+        if keys is None:
+            keys = [_row_key(row) for row in rows]
+        codes = []
+        for row in rows:
+            name = row[2] or ""
+            code = self.champions.get(name)
+            if code is None:
+                code = self.champions[name] = len(self.names)
+                self.names.append(name)
+            codes.append(code)
+        return {
+            "champion": np.array(codes, dtype=np.int16),
+            "kills": np.array([row[3] or 0 for row in rows], dtype=np.int32),
+            "deaths": np.array([row[4] or 0 for row in rows], dtype=np.int32),
+            "assists": np.array([row[5] or 0 for row in rows], dtype=np.int32),
+            "win": np.array([bool(row[6]) for row in rows], dtype=np.bool_),
+            "gameCreation": np.array([row[7] or 0 for row in rows], dtype=np.int64),
+            "gameDuration": np.array([row[8] or 0 for row in rows], dtype=np.int32),
+            "doubleKills": np.array([row[11] or 0 for row in rows], dtype=np.int32),
+            "tripleKills": np.array([row[12] or 0 for row in rows], dtype=np.int32),
+            "goldEarned": np.array([row[13] or 0 for row in rows], dtype=np.int32),
+            "key": np.array(keys, dtype=np.int64),
+            "player": np.array([_hash(player_key(row)) for row in rows], dtype=np.int64),
+            "alive": np.ones(len(rows), dtype=np.bool_),
+        }
+
+    def _lookup(self, keys):
+        """Posição de cada chave nas colunas, ou -1."""
+        found = np.full(len(keys), -1, dtype=np.int64)
+        if len(self.sorted_keys):
+            positions = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+            hit = self.sorted_keys[positions] == keys
+            found[hit] = self.sorted_rows[positions[hit]]
+        if self.recent:
+            for i in np.flatnonzero(found < 0):
+                found[i] = self.recent.get(int(keys[i]), -1)
+        return found
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self.data["key"])
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name, column in self.data.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.data[name] = grown
+
+    def reindex(self):
+        keys = self.view("key")
+        self.sorted_rows = np.argsort(keys, kind="stable").astype(np.int64)
+        self.sorted_keys = keys[self.sorted_rows]
+        self.recent = {}
+
+    def extend(self, rows):
+        """Acrescenta linhas que ainda não estão nas colunas, sem atualizar o índice (ver reindex)."""
+        columns = self._to_columns(rows)
+        self._reserve(len(rows))
+        for name, column in columns.items():
+            self.data[name][self.size:self.size + len(rows)] = column
+        self.size += len(rows)
+
+    def upsert(self, rows):
+        """Grava as linhas: as já conhecidas são substituídas, as novas vão para o fim."""
+        latest = {}
+        for row in rows:
+            latest[_row_key(row)] = row
+        if not latest:
+            return
+        columns = self._to_columns(list(latest.values()), list(latest))
+        positions = self._lookup(columns["key"])
+
+        existing = positions >= 0
+        if existing.any():
+            target = positions[existing]
+            self.dead -= int(np.count_nonzero(~self.data["alive"][target]))
+            for name, column in columns.items():
+                self.data[name][target] = column[existing]
+
+        added = ~existing
+        count = int(np.count_nonzero(added))
+        if count:
+            self._reserve(count)
+            start = self.size
+            for name, column in columns.items():
+                self.data[name][start:start + count] = column[added]
+            self.size += count
+            self.recent.update(zip(columns["key"][added].tolist(), range(start, start + count)))
+            if len(self.recent) > max(4096, len(self.sorted_keys) // 8):
+                self.reindex()
+
+    def remove_players(self, keys):
+        """Marca como removidas as linhas dos jogadores (chaves player_key)."""
+        hashes = np.array([_hash(key) for key in keys], dtype=np.int64)
+        removed = np.isin(self.view("player"), hashes) & self.view("alive")
+        self.data["alive"][:self.size][removed] = False
+        self.dead += int(np.count_nonzero(removed))
+        if self.dead * 4 > self.size:
+            self.compact()
+
+    def compact(self):
+        keep = self.view("alive")
+        for name in self.data:
+            self.data[name] = self.view(name)[keep]
+        self.size = len(self.data["key"])
+        self.dead = 0
+        self.reindex()
+
+
+class ChampionAnalytics:
+    """Colunas das partidas (uma linha por participante) e agregações vetorizadas por campeão."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._columns = None
+        self._write_seq = None
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    def load(self, conn):
+        """Recarrega todas as partidas do banco, lote a lote, num único snapshot.
+
+        As colunas novas são montadas fora do lock e só trocadas no fim.
+        """
+        if np is None:
+            raise RuntimeError("As estatísticas por campeão precisam do pacote numpy (pip install numpy)")
+        columns = _Columns()
+        conn.execute("BEGIN")
+        try:
+            write_seq = last_write_seq(conn)
+            # Cada linha aparece uma vez (chave primária de match_stats): basta acrescentar
+            for rows in iter_matches(conn, batch_size=50000):
+                columns.extend(rows)
+        finally:
+            conn.rollback()
+        columns.reindex()
+        with self._lock:
+            self._columns, self._write_seq = columns, write_seq
+
+    def sync(self, conn):
+        """Carrega as colunas na primeira consulta; depois relê só os jogadores gravados desde então."""
+        with self._load_lock:
+            if self._columns is None:
+                self.load(conn)
+                return
+            conn.execute("BEGIN")
+            try:
+                write_seq = last_write_seq(conn)
+                if write_seq == self._write_seq:
+                    return
+                keys = changed_player_keys(conn, self._write_seq)
+                rows = [row for batch in iter_changed_matches(conn, self._write_seq, batch_size=50000)
+                        for row in batch]
+            finally:
+                conn.rollback()
+            # Chaves sem nenhuma linha agora: Riot IDs antigos cujas partidas passaram para um PUUID
+            gone = set(keys) - {player_key(row) for row in rows}
+            with self._lock:
+                if gone:
+                    self._columns.remove_players(gone)
+                self._columns.upsert(rows)
+                self._write_seq = write_seq
+
+    def champion_stats(self, start=None, end=None, min_games=1, sort="games"):
+        """Agregados por campeão: vitórias, médias, KDA, ouro por minuto e taxas de multi-kills.
+
+        start/end filtram gameCreation (ms). KDA e ouro por minuto trazem também
+        os percentis de PERCENTILES.
+        """
+        if sort not in ("games", "winRate", "kda", "goldPerMinute"):
+            raise ValueError(f"Unknown sort: {sort}")
+        # O lock cobre o cálculo inteiro: sync() altera as colunas no lugar
+        with self._lock:
+            if self._columns is None or not self._columns.size:
+                return []
+            result = self._aggregate(self._columns, start, end, min_games)
+        result.sort(key=lambda stats: (-stats[sort], stats["championName"]))
+        return result
+
+    def _aggregate(self, columns, start, end, min_games):
+        names = columns.names
+        if start is None and end is None and not columns.dead:
+            select = columns.view
+        else:
+            mask = columns.view("alive").copy()
+            if start is not None:
+                mask &= columns.view("gameCreation") >= start
+            if end is not None:
+                mask &= columns.view("gameCreation") < end
+
+            def select(name):
+                return columns.view(name)[mask]
+
+        champion = select("champion")
+        if not len(champion):
+            return []
+
+        kills = select("kills").astype(np.float64)
+        deaths = select("deaths").astype(np.float64)
+        assists = select("assists").astype(np.float64)
+        minutes = np.maximum(select("gameDuration"), 1) / 60.0
+        kda = (kills + assists) / np.maximum(deaths, 1)
+        gold_per_minute = select("goldEarned") / minutes
+
+        size = len(names)
+        games = np.bincount(champion, minlength=size)
+        present = np.flatnonzero(games >= max(min_games, 1))
+        if not len(present):
+            return []
+
+        def mean(values):
+            return np.bincount(champion, weights=values, minlength=size)[present] / games[present]
+
+        # Agrupa as linhas por campeão
+        by_champion = np.argsort(champion, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(games)))
+
+        def percentiles(values):
+            # Em cada grupo, np.partition acha os percentis (nearest-rank) sem ordenar o grupo inteiro
+            grouped = values[by_champion]
+            result = {f"p{q}": np.empty(len(present)) for q in PERCENTILES}
+            for i, code in enumerate(present):
+                group = grouped[bounds[code]:bounds[code + 1]]
+                ranks = [max(int(np.ceil(q / 100 * len(group))), 1) - 1 for q in PERCENTILES]
+                selected = np.partition(group, ranks)[ranks]
+                for q, value in zip(PERCENTILES, selected):
+                    result[f"p{q}"][i] = value
+            return result
+
+        win_rate = mean(select("win").astype(np.float64)) * 100
+        averages = {
+            "kills": mean(kills),
+            "deaths": mean(deaths),
+            "assists": mean(assists),
+            "kda": mean(kda),
+            "goldPerMinute": mean(gold_per_minute),
+            "doubleKillRate": mean(select("doubleKills").astype(np.float64)),
+            "tripleKillRate": mean(select("tripleKills").astype(np.float64)),
+        }
+        kda_percentiles = percentiles(kda)
+        gold_percentiles = percentiles(gold_per_minute)
+
+        result = []
+        for i, code in enumerate(present):
+            stats = {"championName": names[code], "games": int(games[code]), "winRate": float(win_rate[i])}
+            stats.update({name: float(values[i]) for name, values in averages.items()})
+            stats["kdaPercentiles"] = {name: float(values[i]) for name, values in kda_percentiles.items()}
+            stats["goldPerMinutePercentiles"] = {name: float(values[i]) for name, values in gold_percentiles.items()}
+            result.append(stats)
+        return result
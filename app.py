@@ -1,36 +1,219 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from database import create_connection, create_table, insert_matches, query_player_matches
-from call_champions import fetch_jungle_data
+from database import ConnectionPool, create_table, insert_matches, insert_full_matches, query_player_matches, query_player_matches_json, query_player_stats, get_latest_match, get_player_version, player_key, PuuidCache
+from database import get_player as get_player_row, insert_timelines, missing_timelines, query_player_timelines
+from analytics import ChampionAnalytics
+from export import FORMATS, export_chunks
+from jobs import JobQueue
+from response_cache import ResponseCache
+from singleflight import SingleFlight
+from timeline import average_curves, pack_series, unpack_series
+from write_queue import WriteQueue
+import call_champions
+import metrics
+from call_champions import fetch_jungle_data, fetch_new_jungle_data, fetch_full_match_data, fetch_player_timelines, find_player_server, get_puuid_by_riot_id, riot_client, SERVER_MAPPINGS
+import hashlib
 import os
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)
+api = Blueprint("api", __name__)
 
-api_key = os.getenv("RIOT_API_KEY")
-if not api_key:
-    logger.warning("RIOT_API_KEY não está definida no ambiente.")
+def load_config():
+    """Configuração padrão do servidor, lida das variáveis de ambiente."""
+    return {
+        "RIOT_API_KEY": os.getenv("RIOT_API_KEY"),
+        "DATABASE_PATH": os.getenv("DATABASE_PATH", "mydatabase.db"),
+        "DB_READ_POOL_SIZE": int(os.getenv("DB_READ_POOL_SIZE", "8")),
+        "DB_MIGRATION_TIMEOUT": float(os.getenv("DB_MIGRATION_TIMEOUT", "600")),
+        "JOB_WORKERS": int(os.getenv("JOB_WORKERS", "2")),
+        "RESPONSE_CACHE_BYTES": int(os.getenv("RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024))),
+        "RIOT_MAX_WORKERS": int(os.getenv("RIOT_MAX_WORKERS", "8")),
+        "RIOT_ASYNC": os.getenv("RIOT_ASYNC", "0") == "1",
+        "RIOT_ASYNC_CONCURRENCY": int(os.getenv("RIOT_ASYNC_CONCURRENCY", "100")),
+        "ASGI_THREADS": int(os.getenv("ASGI_THREADS", "32")),
+        "REFRESH_RESULT_TTL": float(os.getenv("REFRESH_RESULT_TTL", "5")),
+        "WRITE_BATCH_ROWS": int(os.getenv("WRITE_BATCH_ROWS", "5000")),
+        "WRITE_BATCH_DELAY_MS": float(os.getenv("WRITE_BATCH_DELAY_MS", "2")),
+    }
 
-try:
-    conn = create_connection()
-    logger.info("Conexão com o banco estabelecida")
-except Exception as e:
-    logger.error(f"Erro ao conectar ao banco: {e}")
-    conn = None
+class AppState:
+    """Recursos compartilhados por todas as requisições de uma instância do app."""
 
-@app.route("/")
+    def __init__(self, config):
+        self.api_key = config["RIOT_API_KEY"]
+        self.db = None
+        self.job_queue = None
+        self.writes = None
+        self.puuid_cache = PuuidCache()
+        self.response_cache = ResponseCache(config["RESPONSE_CACHE_BYTES"])
+        self.analytics = ChampionAnalytics()
+        self.refreshes = SingleFlight(config["REFRESH_RESULT_TTL"])
+
+def state():
+    return current_app.extensions["lol_api"]
+
+def create_app(config=None):
+    """Cria o app Flask: abre o pool do banco, aplica o schema e inicia os workers de jobs.
+
+    A inicialização roda uma vez por processo, então o mesmo app serve tanto
+    em desenvolvimento (python app.py) quanto sob gunicorn/uvicorn (wsgi.py/asgi.py).
+    """
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+    CORS(app)
+
+    app_state = AppState(app.config)
+    if not app_state.api_key:
+        logger.warning("RIOT_API_KEY não está definida no ambiente.")
+
+    call_champions.configure(
+        api_key=app_state.api_key,
+        max_workers=app.config["RIOT_MAX_WORKERS"],
+        async_mode=app.config["RIOT_ASYNC"],
+        async_concurrency=app.config["RIOT_ASYNC_CONCURRENCY"],
+    )
+
+    app_state.db = ConnectionPool(app.config["DATABASE_PATH"], read_pool_size=app.config["DB_READ_POOL_SIZE"])
+    try:
+        # Sob gunicorn -w N, os outros workers esperam aqui o que estiver migrando o banco
+        with app_state.db.writer() as conn:
+            create_table(conn, timeout=app.config["DB_MIGRATION_TIMEOUT"])
+        logger.info("Conexão com o banco estabelecida e tabelas verificadas")
+    except Exception as e:
+        # Sem banco todas as rotas falhariam: melhor o worker não subir
+        logger.error(f"Erro ao conectar ao banco: {e}")
+        app_state.db.close()
+        raise
+
+    app_state.writes = WriteQueue(app_state.db, max_rows=app.config["WRITE_BATCH_ROWS"],
+                                  max_delay=app.config["WRITE_BATCH_DELAY_MS"] / 1000)
+    app_state.writes.start()
+
+    if app.config["JOB_WORKERS"] > 0:
+        def run_job(payload, progress):
+            with app.app_context():
+                return run_refresh_job(payload, progress)
+
+        app_state.job_queue = JobQueue(app_state.db, run_job, workers=app.config["JOB_WORKERS"])
+        app_state.job_queue.start()
+
+    app.extensions["lol_api"] = app_state
+    app.before_request(start_request_timer)
+    app.after_request(record_request_metrics)
+    app.register_blueprint(api)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, server_error)
+    return app
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.start_trace()
+
+def record_request_metrics(response):
+    """Registra a duração da rota e, com X-Trace: 1, devolve o detalhamento em Server-Timing."""
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_DURATION.observe(elapsed, request.method, route, response.status_code)
+    if request.headers.get("X-Trace") == "1":
+        response.headers["Server-Timing"] = metrics.server_timing(elapsed)
+    return response
+
+def resolve_puuid(game_name, tag_line, server_code):
+    """Resolve o PUUID pelo cache de players, chamando account-v1 só quando necessário."""
+    if server_code not in SERVER_MAPPINGS:
+        return None
+    routing_region = SERVER_MAPPINGS[server_code]["routing"]
+    return state().puuid_cache.resolve(
+        state().db, f"{game_name}#{tag_line}", routing_region,
+        lambda: get_puuid_by_riot_id(game_name, tag_line, routing_region),
+    )
+
+def resolve_server(game_name, tag_line):
+    """Servidor do jogador para server="auto": o já descoberto em players ou a busca em todos os clusters."""
+    riot_id = f"{game_name}#{tag_line}"
+    with state().db.reader() as conn:
+        row = get_player_row(conn, riot_id)
+    if row is not None and row["server"] in SERVER_MAPPINGS:
+        return row["server"]
+    found = find_player_server(game_name, tag_line, puuid=row["puuid"] if row is not None else None)
+    if found is None:
+        return None
+    puuid, routing_region, server_code = found
+    with state().db.writer() as conn:
+        state().puuid_cache.store(conn, riot_id, puuid, routing_region, server_code)
+    return server_code
+
+@api.route("/")
 def serve_html():
     return send_file("index_um_jogador_botoes_api20.html", mimetype="text/html")
 
-@app.route("/health", methods=["GET"])
+@api.route("/health", methods=["GET"])
 def health_check():
-    return jsonify({"status": "ok", "api_key_configured": bool(api_key)}), 200
+    return jsonify({
+        "status": "ok",
+        "api_key_configured": bool(state().api_key),
+        "riot_client": riot_client.stats(),
+    }), 200
+
+@api.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def cached_player_response(player_name, build):
+    """Responde com ETag/Last-Modified pela versão do jogador, usando o cache de respostas.
+
+    build(conn) retorna (corpo JSON, cabeçalhos extras) e só é chamado quando
+    não há resposta em cache para a versão atual.
+    """
+    response_cache = state().response_cache
+    with state().db.reader() as conn:
+        # Versão e consulta no mesmo snapshot
+        conn.execute("BEGIN")
+        key, version, updated_at = get_player_version(conn, player_name)
+        etag = hashlib.sha1(f"{key}:{version}:{request.full_path}".encode("utf-8")).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        cached = response_cache.get(key, request.full_path, version)
+        metrics.cache_result("response", cached is not None)
+        if cached is None:
+            body, headers = build(conn)
+            cached = (body.encode("utf-8"), headers)
+            response_cache.put(key, request.full_path, version, *cached)
 
-@app.route("/player", methods=["GET"])
+    body, headers = cached
+    response = Response(body, status=200, mimetype="application/json", headers=headers)
+    response.set_etag(etag)
+    if updated_at:
+        response.last_modified = updated_at
+    return response.make_conditional(request)
+
+def write_matches(write, data_list):
+    """Grava pela fila de escrita, junto com as atualizações simultâneas, e espera o commit."""
+    future = state().writes.submit(write, rows=len(data_list))
+    with metrics.timer("sqlite"):
+        future.result()
+    on_matches_written(data_list)
+
+def on_matches_written(data_list):
+    """Descarta as respostas em cache dos jogadores gravados.
+
+    As estatísticas por campeão não são tocadas aqui: a próxima consulta relê
+    esses jogadores pelo write_seq, fora da thread que gravou.
+    """
+    for key in {player_key(row) for row in data_list}:
+        state().response_cache.invalidate(key)
+
+@api.route("/player", methods=["GET"])
 def get_player():
     game_name = request.args.get("name")
     tag_line = request.args.get("tag")
@@ -38,59 +221,311 @@ def get_player():
 
     if not game_name or not tag_line:
         return jsonify({"error": "Name and tag are required parameters"}), 400
-    if not conn:
+    if not state().db:
         return jsonify({"error": "Database connection not available"}), 500
 
     player_name = f"{game_name}#{tag_line}"
 
+    fields = request.args.get("fields")
+    fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    limit = request.args.get("limit", type=int)
+    cursor = request.args.get("cursor")
+
+    def build(conn):
+        body, next_cursor = query_player_matches_json(conn, player_name, fields=fields, limit=limit, cursor=cursor)
+        return body, {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
     try:
-        matches = query_player_matches(conn, player_name)
-        return jsonify(matches), 200
+        return cached_player_response(player_name, build)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao buscar jogador: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/player", methods=["POST"])
+@api.route("/player/stats", methods=["GET"])
+def get_player_stats():
+    game_name = request.args.get("name")
+    tag_line = request.args.get("tag")
+
+    if not game_name or not tag_line:
+        return jsonify({"error": "Name and tag are required parameters"}), 400
+    if not state().db:
+        return jsonify({"error": "Database connection not available"}), 500
+
+    try:
+        start = request.args.get("start", type=int)
+        end = request.args.get("end", type=int)
+        last = request.args.get("last", type=int)
+        by_champion = request.args.get("champion", "0").lower() in ("1", "true", "yes")
+        player_name = f"{game_name}#{tag_line}"
+
+        def build(conn):
+            stats = query_player_stats(conn, player_name, by_champion=by_champion, start=start, end=end, last=last)
+            with metrics.timer("json"):
+                return current_app.json.dumps(stats), {}
+
+        return cached_player_response(player_name, build)
+    except Exception as e:
+        logger.error(f"Erro ao calcular estatísticas: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/player/timelines", methods=["GET"])
+def get_player_timelines():
+    game_name = request.args.get("name")
+    tag_line = request.args.get("tag")
+
+    if not game_name or not tag_line:
+        return jsonify({"error": "Name and tag are required parameters"}), 400
+    if not state().db:
+        return jsonify({"error": "Database connection not available"}), 500
+
+    try:
+        last = max(1, min(request.args.get("last", 10, type=int), 100))
+        aggregate = request.args.get("aggregate", "0").lower() in ("1", "true", "yes")
+        player_name = f"{game_name}#{tag_line}"
+        with state().db.reader() as conn:
+            rows = query_player_timelines(conn, player_name, last)
+        # Séries como listas de números, uma por curva, e não um objeto por minuto
+        timelines = [unpack_series(row["series"], row["minutes"]) for row in rows]
+        frame_interval = rows[0]["frame_interval"] if rows else 60000
+        if aggregate:
+            body = {"player": player_name, "games": len(rows), "frameInterval": frame_interval}
+            body.update(average_curves(timelines))
+        else:
+            body = {"player": player_name, "timelines": [
+                dict({"matchId": row["matchId"], "gameCreation": row["gameCreation"],
+                      "frameInterval": row["frame_interval"]},
+                     **{name: values.tolist() for name, values in series.items()})
+                for row, series in zip(rows, timelines)
+            ]}
+        with metrics.timer("json"):
+            return jsonify(body), 200
+    except Exception as e:
+        logger.error(f"Erro ao buscar timelines: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/stats/champions", methods=["GET"])
+def get_champion_stats():
+    if not state().db:
+        return jsonify({"error": "Database connection not available"}), 500
+    analytics = state().analytics
+    if not analytics.available():
+        return jsonify({"error": "Champion statistics require numpy"}), 500
+
+    try:
+        with state().db.reader() as conn:
+            analytics.sync(conn)
+        with metrics.timer("analytics"):
+            champions = analytics.champion_stats(
+                start=request.args.get("start", type=int),
+                end=request.args.get("end", type=int),
+                min_games=request.args.get("min_games", 1, type=int),
+                sort=request.args.get("sort", "games"),
+            )
+        return jsonify({"champions": champions}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao calcular estatísticas por campeão: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/export", methods=["GET"])
+def export_matches():
+    fmt = request.args.get("format", "ndjson")
+    server_code = request.args.get("server")
+    game_name = request.args.get("name")
+    tag_line = request.args.get("tag")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    if server_code and server_code not in SERVER_MAPPINGS:
+        return jsonify({"error": f"Unknown server: {server_code}"}), 400
+    # Só um dos dois exportaria a tabela inteira em vez das partidas do jogador
+    if bool(game_name) != bool(tag_line):
+        return jsonify({"error": "Name and tag must be given together"}), 400
+    if not state().db:
+        return jsonify({"error": "Database connection not available"}), 500
+
+    filters = {
+        "player_name_with_tag": f"{game_name}#{tag_line}" if game_name and tag_line else None,
+        "champion": request.args.get("champion"),
+        "platform": SERVER_MAPPINGS[server_code]["region"] if server_code else None,
+        "start": request.args.get("start", type=int),
+        "end": request.args.get("end", type=int),
+    }
+    db = state().db
+
+    def generate():
+        # A conexão fica aberta enquanto o cliente baixa: uma só dele, fora do pool de leitura
+        with db.dedicated_reader() as conn:
+            yield from export_chunks(conn, fmt, **filters)
+
+    response = Response(stream_with_context(generate()), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename=matches.{fmt}"
+    return response
+
+def refresh_player(game_name, tag_line, server_code="br", count=10, incremental=False, full=False, timeline=False,
+                   progress=None):
+    """Busca as partidas do jogador na API da Riot e grava no banco.
+
+    Com full=True grava os dez participantes de cada partida, com
+    timeline=True grava também as curvas por minuto das `count` partidas mais
+    recentes e, com server_code="auto", descobre antes o servidor do jogador.
+    Retorna (corpo, status HTTP) sem a lista de partidas.
+    """
+    if server_code == "auto":
+        server_code = resolve_server(game_name, tag_line)
+        if server_code is None:
+            return {"error": "Player not found in any region"}, 404
+    puuid = resolve_puuid(game_name, tag_line, server_code)
+    if not puuid:
+        return {"error": "No data returned from API"}, 404
+
+    body, status = refresh_matches(game_name, tag_line, server_code, puuid, count, incremental, full, progress)
+    if timeline and status < 400:
+        body["new_timelines"] = refresh_timelines(game_name, tag_line, server_code, puuid, count)
+    return body, status
+
+def refresh_timelines(game_name, tag_line, server_code, puuid, count):
+    """Etapa opcional: baixa as timelines das partidas recentes que ainda não as têm. Retorna quantas gravou."""
+    with state().db.reader() as conn:
+        missing = dict(missing_timelines(conn, f"{game_name}#{tag_line}", count))
+    found = fetch_player_timelines(puuid, list(missing), SERVER_MAPPINGS[server_code]["routing"])
+    timelines = [
+        (match_id, missing[match_id], frame_interval, len(series["gold"]), pack_series(series))
+        for match_id, (frame_interval, series) in found.items()
+    ]
+    if timelines:
+        future = state().writes.submit(lambda conn: insert_timelines(conn, puuid, timelines, commit=False),
+                                       rows=len(timelines))
+        with metrics.timer("sqlite"):
+            future.result()
+    return len(timelines)
+
+def refresh_matches(game_name, tag_line, server_code, puuid, count, incremental, full, progress):
+    db = state().db
+    latest_match = None
+    if incremental:
+        with db.reader() as conn:
+            latest_match = get_latest_match(conn, f"{game_name}#{tag_line}")
+
+    if full:
+        result = fetch_full_match_data(game_name, tag_line, server_code, count=count, latest_match=latest_match,
+                                       puuid=puuid, progress=progress)
+        if result is None or not (result[0] or latest_match):
+            return {"error": "No data returned from API"}, 404
+        games, data_list, skipped = result
+        if games:
+            routing_region = SERVER_MAPPINGS[server_code]["routing"]
+            write_matches(lambda conn: insert_full_matches(conn, games, data_list, routing_region, commit=False),
+                          data_list)
+        return {
+            "message": "Data updated",
+            "server": server_code,
+            "new_matches": len(games),
+            "skipped_matches": skipped,
+        }, 201 if games else 200
+
+    if latest_match:
+        result = fetch_new_jungle_data(game_name, tag_line, server_code, latest_match, count=count,
+                                       puuid=puuid, progress=progress)
+        if result is None:
+            return {"error": "No data returned from API"}, 404
+        data_list, skipped = result
+        if data_list:
+            write_matches(lambda conn: insert_matches(conn, data_list, commit=False), data_list)
+        return {
+            "message": "Data updated",
+            "server": server_code,
+            "new_matches": len(data_list),
+            "skipped_matches": skipped,
+        }, 201 if data_list else 200
+
+    data_list = fetch_jungle_data(game_name, tag_line, server_code, count=count, puuid=puuid, progress=progress)
+    if not data_list:
+        return {"error": "No data returned from API"}, 404
+    write_matches(lambda conn: insert_matches(conn, data_list, commit=False), data_list)
+    return {"message": "Data updated", "server": server_code}, 201
+
+def run_refresh_job(payload, progress):
+    body, status = refresh_player(progress=progress, **payload)
+    if status >= 400:
+        raise RuntimeError(body["error"])
+    return body
+
+@api.route("/player", methods=["POST"])
 def post_player():
     data = request.get_json()
     if not data or not data.get("name") or not data.get("tag"):
         return jsonify({"error": "Name and tag are required"}), 400
-    if not conn:
+    if not state().db:
         return jsonify({"error": "Database connection not available"}), 500
 
     game_name = data["name"]
     tag_line = data["tag"]
     server_code = data.get("server", "br")
     count = int(data.get("count", 10))
+    incremental = bool(data.get("incremental", False))
+    full = bool(data.get("full", False))
+    timeline = bool(data.get("timeline", False))
 
-    if not api_key:
+    if not state().api_key:
         return jsonify({"error": "API key not configured"}), 500
 
+    if data.get("async") and state().job_queue:
+        payload = {
+            "game_name": game_name,
+            "tag_line": tag_line,
+            "server_code": server_code,
+            "count": count,
+            "incremental": incremental,
+            "full": full,
+            "timeline": timeline,
+        }
+        # Só pedidos com as mesmas opções reaproveitam o job pendente
+        job_key = f"{server_code}:{game_name}#{tag_line}:{count}:{int(incremental)}:{int(full)}:{int(timeline)}".lower()
+        job_id, created = state().job_queue.enqueue(job_key, payload)
+        response = jsonify({"job_id": job_id, "coalesced": not created, "status_url": f"/jobs/{job_id}"})
+        response.headers["Location"] = f"/jobs/{job_id}"
+        return response, 202
+
+    def refresh():
+        body, status = refresh_player(game_name, tag_line, server_code, count=count,
+                                      incremental=incremental, full=full, timeline=timeline)
+        if status < 400:
+            with state().db.reader() as conn:
+                body["matches"] = query_player_matches(conn, f"{game_name}#{tag_line}")
+        return body, status
+
     try:
-        data_list = fetch_jungle_data(game_name, tag_line, server_code, count=count)
-        if data_list:
-            insert_matches(conn, data_list)
-            matches = query_player_matches(conn, f"{game_name}#{tag_line}")
-            return jsonify({"message": "Data updated", "matches": matches}), 201
-        else:
-            return jsonify({"error": "No data returned from API"}), 404
+        # Atualizações simultâneas (ou repetidas em poucos segundos) do mesmo jogador buscam uma vez só
+        key = (server_code, game_name.lower(), tag_line.lower(), count, incremental, full, timeline)
+        (body, status), shared = state().refreshes.run(key, refresh)
+        metrics.cache_result("refresh", shared)
+        with metrics.timer("json"):
+            response = jsonify(body)
+        if shared:
+            response.headers["X-Coalesced"] = "1"
+        return response, status
     except Exception as e:
         logger.error(f"Erro no POST /player: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.errorhandler(404)
+@api.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    if not state().job_queue:
+        return jsonify({"error": "Job queue not available"}), 500
+    job = state().job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
 def not_found(e):
     return jsonify({"error": "Route not found"}), 404
 
-@app.errorhandler(500)
 def server_error(e):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == "__main__":
-    if conn:
-        try:
-            create_table(conn)
-            logger.info("Tabela verificada com sucesso")
-        except Exception as e:
-            logger.error(f"Erro ao criar/verificar tabela: {e}")
-    app.run(debug=True, host="0.0.0.0")
\ No newline at end of file
+    # Servidor de desenvolvimento; em produção use wsgi.py (gunicorn) ou asgi.py (uvicorn)
+    create_app().run(debug=os.getenv("FLASK_DEBUG", "0") == "1", host="0.0.0.0", use_reloader=False)
@@ -0,0 +1,20 @@
+# asgi.py
+
+"""
+Ponto de entrada ASGI, com as chamadas à Riot feitas por um cliente assíncrono (httpx):
+
+    pip install uvicorn
+    uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 5000
+
+As rotas Flask continuam síncronas e rodam num pool de ASGI_THREADS threads
+por worker, mas os downloads de partidas de todas as requisições do worker
+dividem um único event loop, mantendo centenas de chamadas em andamento
+(RIOT_ASYNC_CONCURRENCY) sem uma thread por chamada.
+"""
+
+from a2wsgi import WSGIMiddleware
+from app import create_app
+
+flask_app = create_app({"RIOT_ASYNC": True})
+# O WsgiToAsgi do asgiref roda todas as requisições numa única thread; o a2wsgi usa um pool de threads
+app = WSGIMiddleware(flask_app, workers=flask_app.config["ASGI_THREADS"])
@@ -1,7 +1,6 @@
 # novo_bd_retrieve.py
 
 import requests
-import statistics
 import json
 
 BASE_URL = "http://localhost:5000"
@@ -29,33 +28,44 @@ def fetch_player_data():
         print(f"❌ Erro ao consultar a API: {e}")
         return None
 
+def fetch_player_stats():
+    """Busca as estatísticas agregadas no servidor (GET /player/stats)."""
+    url = f"{BASE_URL}/player/stats"
+    params = {
+        "name": PLAYER_NAME,
+        "tag": PLAYER_TAG
+    }
+    try:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        return response.json()["overall"]
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Erro ao consultar as estatísticas: {e}")
+        return None
+
 def calcular_estatisticas(matches):
-    """Calcula médias e exibe estatísticas das partidas."""
+    """Exibe as partidas e as estatísticas calculadas pelo servidor."""
     if not matches:
         print("⚠️ Nenhum dado recebido da API.")
         return
 
     print(f"✅ {len(matches)} partidas recebidas da API.\n")
 
-    # Coletar valores para estatísticas
-    kills = [m["kills"] for m in matches]
-    deaths = [m["deaths"] for m in matches]
-    assists = [m["assists"] for m in matches]
-    gold = [m["goldEarned"] for m in matches]
-    vitorias = [m["win"] for m in matches]
-
     print("🎮 Primeiras 5 partidas:")
     for i, m in enumerate(matches[:5], 1):
         print(f"[{i}] {m['championName']} - {m['kills']}/{m['deaths']}/{m['assists']} - "
               f"Ouro: {m['goldEarned']} - Vitória: {'✅' if m['win'] else '❌'}")
 
     # Estatísticas
+    stats = fetch_player_stats()
+    if not stats:
+        return
     print("\n📊 Estatísticas gerais:")
-    print(f"- Média de kills: {statistics.mean(kills):.2f}")
-    print(f"- Média de deaths: {statistics.mean(deaths):.2f}")
-    print(f"- Média de assists: {statistics.mean(assists):.2f}")
-    print(f"- Média de ouro ganho: {statistics.mean(gold):,.0f}")
-    print(f"- Taxa de vitórias: {sum(vitorias) / len(vitorias) * 100:.1f}%")
+    print(f"- Média de kills: {stats['kills']:.2f}")
+    print(f"- Média de deaths: {stats['deaths']:.2f}")
+    print(f"- Média de assists: {stats['assists']:.2f}")
+    print(f"- Média de ouro ganho: {stats['goldEarned']:,.0f}")
+    print(f"- Taxa de vitórias: {stats['winRate']:.1f}%")
 
 if __name__ == "__main__":
     partidas = fetch_player_data()
@@ -0,0 +1,263 @@
+# bench/fake_riot.py
+
+"""
+Servidor local que imita a API da Riot (account-v1 e match-v5) para os benchmarks.
+
+Os dados são sintéticos e determinísticos: o jogador "benchN#BR1" joga no
+lobby N // 10, e os dez jogadores de um lobby dividem as mesmas partidas.
+A latência, os limites de taxa (com os cabeçalhos X-App-Rate-Limit*) e a
+taxa de respostas 429 injetadas são configuráveis.
+
+Uso isolado:
+    python -m bench.fake_riot --port 8080 --latency-ms 30
+    RIOT_API_BASE_URL="http://127.0.0.1:8080/{routing}" python app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+BASE_CREATION = 1_700_000_000_000
+GAME_INTERVAL_MS = 3_600_000
+HISTORY_SIZE = 1000
+CHAMPIONS = ["LeeSin", "Graves", "Kindred", "Viego", "Hecarim", "Elise", "Nidalee", "KhaZix", "Amumu", "Vi"]
+
+
+def player_slot(game_name):
+    """Lobby e posição (0-9) do jogador sintético."""
+    match = re.fullmatch(r"bench(\d+)", game_name)
+    number = int(match.group(1)) if match else zlib.crc32(game_name.encode("utf-8")) % 100_000 + 100_000
+    return number // 10, number % 10
+
+
+def lobby_player(lobby, slot):
+    return f"bench{lobby * 10 + slot}", "BR1"
+
+
+def puuid_for(game_name, tag_line):
+    return f"puuid-{game_name}-{tag_line}"
+
+
+def match_id_for(lobby, index):
+    return f"BR1_{lobby * 100_000 + index}"
+
+
+def game_creation(index):
+    return BASE_CREATION - index * GAME_INTERVAL_MS
+
+
+def match_payload(match_id):
+    number = int(match_id.split("_")[1])
+    lobby, index = divmod(number, 100_000)
+    rng = random.Random(number)
+    duration = rng.randint(1200, 2400)
+    participants = []
+    for slot in range(10):
+        game_name, tag_line = lobby_player(lobby, slot)
+        participants.append({
+            "puuid": puuid_for(game_name, tag_line),
+            "riotIdGameName": game_name,
+            "riotIdTagline": tag_line,
+            "participantId": slot + 1,
+            "teamId": 100 if slot < 5 else 200,
+            "championName": CHAMPIONS[(slot + index) % len(CHAMPIONS)],
+            "kills": rng.randint(0, 15),
+            "deaths": rng.randint(0, 12),
+            "assists": rng.randint(0, 20),
+            "win": (slot < 5) == (index % 2 == 0),
+            "bountyLevel": rng.randint(0, 5),
+            "damageDealtToObjectives": rng.randint(0, 30000),
+            "doubleKills": rng.randint(0, 3),
+            "tripleKills": rng.randint(0, 1),
+            "goldEarned": rng.randint(6000, 18000),
+        })
+    return {
+        "metadata": {"matchId": match_id, "participants": [p["puuid"] for p in participants]},
+        "info": {
+            "gameCreation": game_creation(index),
+            "gameDuration": duration,
+            "gameMode": "CLASSIC",
+            "gameVersion": "14.1.1",
+            "platformId": "BR1",
+            "queueId": 420,
+            "participants": participants,
+        },
+    }
+
+
+def timeline_payload(match_id):
+    details = match_payload(match_id)
+    minutes = details["info"]["gameDuration"] // 60 + 1
+    rng = random.Random(match_id)
+    frames = []
+    for minute in range(minutes):
+        frames.append({
+            "timestamp": minute * 60_000,
+            "participantFrames": {
+                str(pid): {
+                    "participantId": pid,
+                    "totalGold": 500 + minute * rng.randint(300, 450),
+                    "xp": minute * rng.randint(350, 500),
+                    "minionsKilled": minute * rng.randint(0, 8),
+                    "jungleMinionsKilled": minute * rng.randint(0, 5),
+                    "level": min(18, 1 + minute // 2),
+                }
+                for pid in range(1, 11)
+            },
+        })
+    return {
+        "metadata": {"matchId": match_id},
+        "info": {
+            "frameInterval": 60_000,
+            "frames": frames,
+            "participants": [{"participantId": p["participantId"], "puuid": p["puuid"]}
+                             for p in details["info"]["participants"]],
+        },
+    }
+
+
+class FakeRiotServer:
+    """Servidor HTTP em thread própria; `calls` conta as requisições por endpoint."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=20.0, jitter_ms=5.0,
+                 app_rate_limit="500:1,30000:120", error_rate=0.0, retry_after=1, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.app_rate_limit = app_rate_limit
+        self.windows = [tuple(int(v) for v in part.split(":")) for part in app_rate_limit.split(",")]
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._sent = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{{routing}}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _admit(self, routing):
+        """Aplica o limite da aplicação por região. Retorna (permitido, contagens por janela)."""
+        with self._lock:
+            now = time.monotonic()
+            sent = self._sent.setdefault(routing, {seconds: deque() for _, seconds in self.windows})
+            for _, seconds in self.windows:
+                while sent[seconds] and sent[seconds][0] <= now - seconds:
+                    sent[seconds].popleft()
+            allowed = all(len(sent[seconds]) < limit for limit, seconds in self.windows)
+            if allowed:
+                for _, seconds in self.windows:
+                    sent[seconds].append(now)
+            counts = ",".join(f"{len(sent[seconds])}:{seconds}" for _, seconds in self.windows)
+            injected = allowed and self._random.random() < self.error_rate
+            return allowed and not injected, injected, counts
+
+    def _route(self, path, query):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        rest = "/".join(parts[1:])
+        if rest.startswith("riot/account/v1/accounts/by-riot-id/"):
+            game_name, tag_line = parts[-2], parts[-1]
+            return "account", {"puuid": puuid_for(game_name, tag_line), "gameName": game_name, "tagLine": tag_line}
+        if rest.startswith("lol/match/v5/matches/by-puuid/") and rest.endswith("/ids"):
+            game_name = parts[-2].split("-")[1]
+            lobby, _ = player_slot(game_name)
+            start = int(query.get("start", ["0"])[0])
+            count = int(query.get("count", ["20"])[0])
+            start_time = query.get("startTime", [None])[0]
+            indexes = range(HISTORY_SIZE)
+            if start_time is not None:
+                indexes = [i for i in indexes if game_creation(i) // 1000 >= int(start_time)]
+            return "match_ids", [match_id_for(lobby, i) for i in list(indexes)[start:start + count]]
+        if rest.startswith("lol/match/v5/matches/") and rest.endswith("/timeline"):
+            return "timeline", timeline_payload(parts[-2])
+        if rest.startswith("lol/match/v5/matches/"):
+            return "match", match_payload(parts[-1])
+        return "unknown", None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                routing = url.path.strip("/").split("/")[0]
+                endpoint, body = server._route(url.path, parse_qs(url.query))
+                latency = max(0.0, server._random.gauss(server.latency_ms, server.jitter_ms)) / 1000
+                time.sleep(latency)
+
+                allowed, injected, counts = server._admit(routing)
+                with server._lock:
+                    server.calls[endpoint] += 1
+                    server.calls["total"] += 1
+                    if not allowed:
+                        server.calls["429"] += 1
+
+                if not allowed:
+                    status, payload = 429, {"status": {"message": "Rate limit exceeded", "status_code": 429}}
+                elif body is None:
+                    status, payload = 404, {"status": {"message": "Not found", "status_code": 404}}
+                else:
+                    status, payload = 200, body
+
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("X-App-Rate-Limit", server.app_rate_limit)
+                self.send_header("X-App-Rate-Limit-Count", counts)
+                if status == 429:
+                    self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("X-Rate-Limit-Type", "service" if injected else "application")
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API da Riot falsa para testes de carga.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--rate-limit", default="500:1,30000:120", help="limite da aplicação por região")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 429 injetadas")
+    args = parser.parse_args()
+
+    server = FakeRiotServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.rate_limit, args.error_rate)
+    print(f"API da Riot falsa em {server.base_url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
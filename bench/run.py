@@ -0,0 +1,168 @@
+# bench/run.py
+
+"""
+Benchmark offline: sobe a API da Riot falsa (bench/fake_riot.py) e mede
+fetch_jungle_data, insert_matches, query_player_matches e as rotas Flask em
+vários níveis de concorrência. O relatório sai em JSON (latência p50/p99,
+vazão e chamadas à API), para comparar versões.
+
+Uso:
+    python -m bench.run --concurrency 1,8,32 --players 20 --output bench.json
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_riot import FakeRiotServer
+
+
+def percentile(sorted_values, fraction):
+    """Percentil pelo método nearest-rank."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def measure(name, concurrency, tasks, server):
+    """Executa as tarefas com `concurrency` threads e resume latências e chamadas à API."""
+    calls_before = server.calls["total"]
+    throttled_before = server.calls["429"]
+    latencies = []
+
+    def timed(task):
+        started = time.perf_counter()
+        task()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(timed, task) for task in tasks]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "ops": len(tasks),
+        "wall_s": round(wall, 4),
+        "throughput_ops_s": round(len(tasks) / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        "upstream_calls": server.calls["total"] - calls_before,
+        "upstream_429": server.calls["429"] - throttled_before,
+    }
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="lol-bench-")
+    server = FakeRiotServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            app_rate_limit=args.rate_limit, error_rate=args.error_rate).start()
+
+    # Os módulos leem a configuração ao serem importados
+    os.environ["RIOT_API_BASE_URL"] = server.base_url
+    os.environ["RIOT_API_KEY"] = "bench"
+    os.environ["MATCH_CACHE_PATH"] = os.path.join(workdir, "matchcache.db")
+    from app import create_app
+    from call_champions import fetch_jungle_data, riot_client
+    from database import ConnectionPool, create_table, insert_matches, query_player_matches
+
+    db_path = os.path.join(workdir, "bench.db")
+    db = ConnectionPool(db_path)
+    with db.writer() as conn:
+        create_table(conn)
+    app = create_app({"DATABASE_PATH": db_path, "JOB_WORKERS": 0})
+
+    results = []
+    lobby = 0
+    for concurrency in args.concurrency:
+        # Um jogador por lobby: nenhuma partida é compartilhada, o cache começa frio
+        players = [f"bench{(lobby + i) * 10}" for i in range(args.players)]
+        lobby += args.players
+        fetched = {}
+
+        def fetch(name):
+            fetched[name] = fetch_jungle_data(name, "BR1", "br", count=args.count)
+
+        results.append(measure("fetch_jungle_data.cold", concurrency,
+                               [lambda name=name: fetch(name) for name in players], server))
+        results.append(measure("fetch_jungle_data.warm", concurrency,
+                               [lambda name=name: fetch(name) for name in players], server))
+
+        def insert(rows):
+            with db.writer() as conn:
+                insert_matches(conn, rows)
+
+        results.append(measure("insert_matches", concurrency,
+                               [lambda rows=rows: insert(rows) for rows in fetched.values()], server))
+
+        def query(name):
+            with db.reader() as conn:
+                query_player_matches(conn, f"{name}#BR1")
+
+        results.append(measure("query_player_matches", concurrency,
+                               [lambda name=name: query(name) for name in players], server))
+
+        def route(method, path, **kwargs):
+            response = app.test_client().open(path, method=method, **kwargs)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {path}: {response.status_code}")
+
+        for label, method, path, body in [
+            ("GET /player", "GET", "/player?name={}&tag=BR1", None),
+            ("GET /player/stats", "GET", "/player/stats?name={}&tag=BR1&champion=1", None),
+            ("POST /player", "POST", "/player", {"tag": "BR1", "count": args.count, "incremental": True}),
+        ]:
+            tasks = []
+            for name in players:
+                if body is None:
+                    tasks.append(lambda path=path.format(name): route(method, path))
+                else:
+                    tasks.append(lambda json_body=dict(body, name=name): route(method, path, json=json_body))
+            results.append(measure(label, concurrency, tasks, server))
+
+    report = {
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "results": results,
+        "upstream_calls": dict(server.calls),
+        "riot_client": riot_client.stats(),
+    }
+    server.stop()
+    db.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline com uma API da Riot falsa.")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--players", type=int, default=20, help="jogadores por nível de concorrência")
+    parser.add_argument("--count", type=int, default=20, help="partidas por jogador")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--rate-limit", default="500:1,30000:120", help="limite da aplicação por região")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 429 injetadas")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
-import requests
+import asyncio
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from urllib.parse import quote
 from dotenv import load_dotenv
+from riot_client import RiotClient
+from match_cache import MatchCache
+import metrics
+from timeline import player_series
 
 load_dotenv()
 
@@ -23,37 +30,343 @@ SERVER_MAPPINGS = {
     "vn": {"region": "vn2", "routing": "sea"},
 }
 
+# Servidor de cada plataforma (prefixo dos matchIds, ex.: "BR1_...")
+PLATFORM_SERVERS = {info["region"]: code for code, info in SERVER_MAPPINGS.items()}
+# account-v1 responde em qualquer um destes clusters; as partidas ficam no cluster do servidor
+ACCOUNT_REGIONS = ("americas", "europe", "asia")
+MATCH_REGIONS = ("americas", "europe", "asia", "sea")
+
 API_KEY = os.getenv("RIOT_API_KEY")
+MAX_WORKERS = int(os.getenv("RIOT_MAX_WORKERS", "8"))
+ASYNC_MODE = os.getenv("RIOT_ASYNC", "0") == "1"
+ASYNC_CONCURRENCY = int(os.getenv("RIOT_ASYNC_CONCURRENCY", "100"))
+
+riot_client = RiotClient(api_key=API_KEY, pool_size=MAX_WORKERS)
+match_cache = MatchCache(os.getenv("MATCH_CACHE_PATH", "matchcache.db"))
+metrics.register_stats("riot_client_events_total", "Requisições à Riot enviadas, enfileiradas, limitadas e repetidas.",
+                       "event", riot_client.stats)
+
+# Downloads de partidas em andamento, para que jogadores da mesma partida baixem uma vez só
+_inflight_matches = {}
+_inflight_lock = threading.Lock()
+
+# Event loop compartilhado pelas chamadas assíncronas (modo RIOT_ASYNC)
+_loop = None
+_loop_lock = threading.Lock()
+
+def configure(api_key=None, max_workers=None, async_mode=None, async_concurrency=None):
+    """Ajusta a chave, a concorrência e o modo (threads ou asyncio) das chamadas à Riot."""
+    global MAX_WORKERS, ASYNC_MODE, ASYNC_CONCURRENCY
+    if api_key:
+        riot_client.api_key = api_key
+    if max_workers:
+        MAX_WORKERS = max_workers
+        riot_client.pool_size = max_workers
+    if async_mode is not None:
+        ASYNC_MODE = async_mode
+    if async_concurrency:
+        ASYNC_CONCURRENCY = async_concurrency
+
+def _event_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="riot-async", daemon=True).start()
+        return _loop
+
+def _account_path(game_name, tag_line):
+    return f"/riot/account/v1/accounts/by-riot-id/{quote(game_name)}/{quote(tag_line)}"
+
+def _match_ids_path(puuid):
+    return f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
 
 def get_puuid_by_riot_id(game_name, tag_line, routing_region):
-    url = f"https://{routing_region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}?api_key={API_KEY}"
-    response = requests.get(url)
+    response = riot_client.get(routing_region, "account-v1.by-riot-id", _account_path(game_name, tag_line))
     if response.status_code == 200:
         return response.json().get("puuid")
     return None
 
-def get_match_ids(puuid, region, count=10):
-    url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?count={count}&api_key={API_KEY}"
-    response = requests.get(url)
+async def _get_json_async(routing_region, method, path, params=None):
+    response = await riot_client.get_async(routing_region, method, path, params=params,
+                                           max_connections=ASYNC_CONCURRENCY)
+    return response.json() if response.status_code == 200 else None
+
+async def _get_puuid_async(game_name, tag_line, routing_region):
+    account = await _get_json_async(routing_region, "account-v1.by-riot-id", _account_path(game_name, tag_line))
+    return account.get("puuid") if account else None
+
+def get_match_ids(puuid, region, count=10, start=0, start_time=None):
+    path = _match_ids_path(puuid)
+    params = {"count": count, "start": start}
+    if start_time is not None:
+        params["startTime"] = start_time
+    response = riot_client.get(region, "match-v5.ids", path, params=params)
     if response.status_code == 200:
         return response.json()
     return []
 
 def get_match_details(match_id, region):
-    url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}?api_key={API_KEY}"
-    response = requests.get(url)
+    cached = match_cache.get(match_id)
+    metrics.cache_result("match", cached is not None)
+    if cached is not None:
+        return cached
+
+    with _inflight_lock:
+        future = _inflight_matches.get(match_id)
+        owner = future is None
+        if owner:
+            future = _inflight_matches[match_id] = Future()
+    if not owner:
+        return future.result()
+
+    try:
+        # Outro download pode ter terminado entre a consulta ao cache e o lock
+        match_details = match_cache.get(match_id) or _download_match_details(match_id, region)
+        future.set_result(match_details)
+        return match_details
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_matches.pop(match_id, None)
+
+def _download_match_details(match_id, region):
+    path = f"/lol/match/v5/matches/{match_id}"
+    response = riot_client.get(region, "match-v5.match", path)
     if response.status_code == 200:
-        return response.json()
+        match_details = response.json()
+        match_cache.put(match_id, match_details)
+        return match_details
     return None
 
-def fetch_jungle_data(game_name, tag_line, server_code, count=10):
+async def _get_match_details_async(match_id, region, semaphore):
+    # O cache (SQLite, zlib e JSON atrás de um lock) roda fora do event loop, que carrega todas as chamadas em andamento
+    cached = await asyncio.to_thread(match_cache.get, match_id)
+    metrics.cache_result("match", cached is not None)
+    if cached is not None:
+        return cached
+
+    # Mesmo registro de downloads em andamento do modo com threads
+    with _inflight_lock:
+        future = _inflight_matches.get(match_id)
+        owner = future is None
+        if owner:
+            future = _inflight_matches[match_id] = Future()
+    if not owner:
+        return await asyncio.wrap_future(future)
+
+    try:
+        match_details = await asyncio.to_thread(match_cache.get, match_id)
+        if match_details is None:
+            async with semaphore:
+                path = f"/lol/match/v5/matches/{match_id}"
+                response = await riot_client.get_async(region, "match-v5.match", path,
+                                                       max_connections=ASYNC_CONCURRENCY)
+            if response.status_code == 200:
+                match_details = response.json()
+                await asyncio.to_thread(match_cache.put, match_id, match_details)
+        future.set_result(match_details)
+        return match_details
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_matches.pop(match_id, None)
+
+async def _download_matches_async(match_ids, routing_region, progress=None):
+    semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    done = 0
+
+    async def download(match_id):
+        nonlocal done
+        match_details = await _get_match_details_async(match_id, routing_region, semaphore)
+        done += 1
+        if progress:
+            await asyncio.to_thread(progress, done, len(match_ids))
+        return match_details
+
+    return await asyncio.gather(*(download(match_id) for match_id in match_ids))
+
+def get_new_match_ids(puuid, region, latest_match_id, latest_game_creation, count=10):
+    """Pagina os IDs de partidas mais novas que a última conhecida, parando ao encontrá-la."""
+    # startTime é em segundos e inclusivo, então a própria partida conhecida
+    # costuma voltar na página e serve de ponto de parada
+    start_time = latest_game_creation // 1000 if latest_game_creation else None
+    new_ids = []
+    start = 0
+    while len(new_ids) < count:
+        page_size = min(count - len(new_ids), 100)
+        page = get_match_ids(puuid, region, count=page_size, start=start, start_time=start_time)
+        for match_id in page:
+            if match_id == latest_match_id:
+                return new_ids
+            new_ids.append(match_id)
+        if len(page) < page_size:
+            break
+        start += len(page)
+    return new_ids
+
+def _first_hit(regions, probe, probe_async):
+    """Roda probe(região) em todas as regiões ao mesmo tempo e fica com a primeira resposta não vazia.
+
+    Retorna (região, resultado) ou None. As consultas restantes são canceladas
+    (no modo assíncrono) ou abandonadas sem segurar quem chamou (threads).
+    """
+    if ASYNC_MODE:
+        future = asyncio.run_coroutine_threadsafe(_first_hit_async(regions, probe_async), _event_loop())
+        return future.result()
+
+    executor = ThreadPoolExecutor(max_workers=len(regions), thread_name_prefix="region-probe")
+    futures = {executor.submit(metrics.with_trace(probe), region): region for region in regions}
+    try:
+        for future in as_completed(futures):
+            # Uma região fora do ar não impede a resposta das outras
+            if future.exception() is None and future.result():
+                return futures[future], future.result()
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+async def _first_hit_async(regions, probe_async):
+    pending = {asyncio.ensure_future(probe_async(region)): region for region in regions}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                region = pending.pop(task)
+                if task.exception() is None and task.result():
+                    return region, task.result()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+def find_player_server(game_name, tag_line, puuid=None):
+    """Descobre o servidor de um jogador consultando todos os clusters em paralelo.
+
+    O PUUID vem do cluster account-v1 que responder primeiro e o servidor, do
+    prefixo do matchId mais recente no cluster de match-v5 que tiver partidas.
+    Retorna (puuid, routing_region, server_code), ou None se a conta não existir
+    ou não tiver partidas.
+    """
+    if puuid is None:
+        hit = _first_hit(
+            ACCOUNT_REGIONS,
+            lambda region: get_puuid_by_riot_id(game_name, tag_line, region),
+            lambda region: _get_puuid_async(game_name, tag_line, region),
+        )
+        if hit is None:
+            return None
+        puuid = hit[1]
+
+    hit = _first_hit(
+        MATCH_REGIONS,
+        lambda region: get_match_ids(puuid, region, count=1),
+        lambda region: _get_json_async(region, "match-v5.ids", _match_ids_path(puuid), {"count": 1, "start": 0}),
+    )
+    if hit is None:
+        return None
+    routing_region, match_ids = hit
+    server_code = PLATFORM_SERVERS.get(match_ids[0].split("_")[0].lower())
+    if server_code is None:
+        return None
+    return puuid, routing_region, server_code
+
+def build_match_row(match_id, match_details, participant, player_name_with_tag):
+    """Monta a tupla gravada na tabela matches para um participante da partida."""
+    return (
+        match_id,
+        player_name_with_tag,
+        participant.get("championName", ""),
+        participant.get("kills", 0),
+        participant.get("deaths", 0),
+        participant.get("assists", 0),
+        participant.get("win", False),
+        match_details["info"].get("gameCreation", 0),
+        match_details["info"].get("gameDuration", 0),
+        participant.get("bountyLevel", 0),
+        participant.get("damageDealtToObjectives", 0),
+        participant.get("doubleKills", 0),
+        participant.get("tripleKills", 0),
+        participant.get("goldEarned", 0),
+        participant.get("puuid")
+    )
+
+def participant_riot_id(participant):
+    """Riot ID "nome#tag" de um participante do payload da partida."""
+    game_name = participant.get("riotIdGameName") or participant.get("summonerName", "")
+    return f"{game_name}#{participant.get('riotIdTagline', '')}"
+
+def build_full_match(match_id, match_details, puuid=None, player_name_with_tag=None):
+    """Normaliza a partida inteira: (linha da tabela games, linhas dos dez participantes).
+
+    O participante com `puuid` recebe o nome `player_name_with_tag` usado na busca.
+    """
+    info = match_details["info"]
+    game_row = (
+        match_id,
+        info.get("gameCreation", 0),
+        info.get("gameDuration", 0),
+        info.get("gameVersion", ""),
+        info.get("queueId", 0),
+        info.get("platformId", ""),
+        info.get("gameMode", "")
+    )
+    rows = []
+    for participant in info["participants"]:
+        if puuid and participant.get("puuid") == puuid:
+            name = player_name_with_tag
+        else:
+            name = participant_riot_id(participant)
+        rows.append(build_match_row(match_id, match_details, participant, name))
+    return game_row, rows
+
+def _download_matches(match_ids, routing_region, max_workers=None, progress=None):
+    if ASYNC_MODE:
+        # Todas as requisições do processo dividem um event loop: centenas de chamadas em voo sem uma thread cada
+        future = asyncio.run_coroutine_threadsafe(
+            _download_matches_async(match_ids, routing_region, progress), _event_loop()
+        )
+        return list(future.result())
+
+    # Baixa os detalhes em paralelo; executor.map preserva a ordem dos match_ids
+    workers = min(max_workers or MAX_WORKERS, len(match_ids))
+    details = []
+    download = metrics.with_trace(lambda match_id: get_match_details(match_id, routing_region))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for match_details in executor.map(download, match_ids):
+            details.append(match_details)
+            if progress:
+                progress(len(details), len(match_ids))
+    return details
+
+def _fetch_match_rows(puuid, match_ids, routing_region, player_name_with_tag, max_workers=None, progress=None):
+    data_list = []
+    details = _download_matches(match_ids, routing_region, max_workers, progress)
+
+    for match_id, match_details in zip(match_ids, details):
+        if not match_details:
+            continue
+
+        for participant in match_details["info"]["participants"]:
+            if participant.get("puuid") == puuid:
+                data_list.append(build_match_row(match_id, match_details, participant, player_name_with_tag))
+                break
+
+    return data_list
+
+def fetch_jungle_data(game_name, tag_line, server_code, count=10, max_workers=None, puuid=None, progress=None):
     if server_code not in SERVER_MAPPINGS:
         return []
 
     server_info = SERVER_MAPPINGS[server_code]
     routing_region = server_info["routing"]
 
-    puuid = get_puuid_by_riot_id(game_name, tag_line, routing_region)
+    # Com o PUUID já resolvido (cache de players) a chamada account-v1 é dispensada
+    puuid = puuid or get_puuid_by_riot_id(game_name, tag_line, routing_region)
     if not puuid:
         return []
 
@@ -61,33 +374,103 @@ def fetch_jungle_data(game_name, tag_line, server_code, count=10):
     if not match_ids:
         return []
 
-    data_list = []
-    player_name_with_tag = f"{game_name}#{tag_line}"
+    return _fetch_match_rows(puuid, match_ids, routing_region, f"{game_name}#{tag_line}", max_workers, progress)
+
+def fetch_new_jungle_data(game_name, tag_line, server_code, latest_match, count=10, max_workers=None, puuid=None,
+                          progress=None):
+    """Busca só as partidas mais novas que latest_match = (matchId, gameCreation).
+
+    Retorna (data_list, skipped), onde skipped é quantas das `count` partidas
+    pedidas já estavam no banco e não foram baixadas, ou None se o jogador
+    não foi encontrado.
+    """
+    if server_code not in SERVER_MAPPINGS:
+        return None
+
+    routing_region = SERVER_MAPPINGS[server_code]["routing"]
+
+    puuid = puuid or get_puuid_by_riot_id(game_name, tag_line, routing_region)
+    if not puuid:
+        return None
+
+    latest_match_id, latest_game_creation = latest_match
+    match_ids = get_new_match_ids(puuid, routing_region, latest_match_id, latest_game_creation, count=count)
+    skipped = count - len(match_ids)
+    if not match_ids:
+        return [], skipped
+
+    data_list = _fetch_match_rows(puuid, match_ids, routing_region, f"{game_name}#{tag_line}", max_workers, progress)
+    return data_list, skipped
+
+def _get_player_series(match_id, routing_region, puuid):
+    response = riot_client.get(routing_region, "match-v5.timeline", f"/lol/match/v5/matches/{match_id}/timeline")
+    if response.status_code != 200:
+        return None
+    return player_series(response.json(), puuid)
 
-    for match_id in match_ids:
-        match_details = get_match_details(match_id, routing_region)
+async def _download_timelines_async(match_ids, routing_region, puuid):
+    semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+
+    async def download(match_id):
+        async with semaphore:
+            timeline = await _get_json_async(routing_region, "match-v5.timeline",
+                                             f"/lol/match/v5/matches/{match_id}/timeline")
+        return player_series(timeline, puuid) if timeline else None
+
+    return await asyncio.gather(*(download(match_id) for match_id in match_ids))
+
+def fetch_player_timelines(puuid, match_ids, routing_region, max_workers=None):
+    """Baixa a timeline de cada partida e guarda só as séries do jogador.
+
+    O payload inteiro (centenas de KB) é descartado assim que as séries são
+    extraídas. Retorna {matchId: (frame_interval, séries)} das partidas encontradas.
+    """
+    if not match_ids:
+        return {}
+    if ASYNC_MODE:
+        future = asyncio.run_coroutine_threadsafe(
+            _download_timelines_async(match_ids, routing_region, puuid), _event_loop()
+        )
+        results = future.result()
+    else:
+        workers = min(max_workers or MAX_WORKERS, len(match_ids))
+        download = metrics.with_trace(lambda match_id: _get_player_series(match_id, routing_region, puuid))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(download, match_ids))
+    return {match_id: result for match_id, result in zip(match_ids, results) if result is not None}
+
+def fetch_full_match_data(game_name, tag_line, server_code, count=10, latest_match=None, max_workers=None,
+                          puuid=None, progress=None):
+    """Busca as partidas do jogador guardando os dez participantes de cada uma.
+
+    Com latest_match = (matchId, gameCreation) busca só as partidas mais novas.
+    Retorna (games, data_list, skipped), ou None se o jogador não foi encontrado.
+    """
+    if server_code not in SERVER_MAPPINGS:
+        return None
+
+    routing_region = SERVER_MAPPINGS[server_code]["routing"]
+
+    puuid = puuid or get_puuid_by_riot_id(game_name, tag_line, routing_region)
+    if not puuid:
+        return None
+
+    if latest_match:
+        match_ids = get_new_match_ids(puuid, routing_region, *latest_match, count=count)
+        skipped = count - len(match_ids)
+    else:
+        match_ids = get_match_ids(puuid, routing_region, count=count)
+        skipped = 0
+    if not match_ids:
+        return [], [], skipped
+
+    games, data_list = [], []
+    details = _download_matches(match_ids, routing_region, max_workers, progress)
+    for match_id, match_details in zip(match_ids, details):
         if not match_details:
             continue
+        game_row, rows = build_full_match(match_id, match_details, puuid, f"{game_name}#{tag_line}")
+        games.append(game_row)
+        data_list.extend(rows)
 
-        for participant in match_details["info"]["participants"]:
-            if participant.get("puuid") == puuid:
-                match_data = (
-                    match_id,
-                    player_name_with_tag,
-                    participant.get("championName", ""),
-                    participant.get("kills", 0),
-                    participant.get("deaths", 0),
-                    participant.get("assists", 0),
-                    participant.get("win", False),
-                    match_details["info"].get("gameCreation", 0),
-                    match_details["info"].get("gameDuration", 0),
-                    participant.get("bountyLevel", 0),
-                    participant.get("damageDealtToObjectives", 0),
-                    participant.get("doubleKills", 0),
-                    participant.get("tripleKills", 0),
-                    participant.get("goldEarned", 0)
-                )
-                data_list.append(match_data)
-                break
-
-    return data_list
\ No newline at end of file
+    return games, data_list, skipped
@@ -1,15 +1,119 @@
 # database.py
 
+import os
 import sqlite3
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
-def create_connection(db_file="mydatabase.db"):
+import metrics
+from metrics import timed_sqlite
+
+PUUID_TTL = int(os.getenv("PUUID_TTL", str(7 * 24 * 3600)))
+CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", "16384"))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+MAX_PAGE_SIZE = 1000
+
+MATCH_COLUMNS = (
+    "matchId", "Player_name", "championName", "kills", "deaths", "assists", "win",
+    "gameCreation", "gameDuration", "bountyLevel", "damageDealtToObjectives",
+    "doubleKills", "tripleKills", "goldEarned", "puuid",
+)
+
+def create_connection(db_file="mydatabase.db", readonly=False):
     """Cria (se não existir) ou conecta a um banco de dados SQLite."""
-    conn = sqlite3.connect(db_file, check_same_thread=False)
+    conn = sqlite3.connect(db_file, check_same_thread=False, timeout=5)
     conn.row_factory = sqlite3.Row  # Permite acessar colunas pelo nome
+    # WAL: leitores não bloqueiam o escritor (nem são bloqueados por ele)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
     return conn
 
-def create_table(conn):
-    """Cria a tabela para armazenar dados de partidas, se ela ainda não existir."""
+class ConnectionPool:
+    """Pool de conexões SQLite: várias conexões de leitura e uma única de escrita.
+
+    As leituras rodam em paralelo entre as threads de requisição enquanto uma
+    atualização grava pela conexão de escrita, protegida por um lock.
+    """
+
+    def __init__(self, db_file="mydatabase.db", read_pool_size=8):
+        self.db_file = db_file
+        self.read_pool_size = read_pool_size
+        self._readers = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None
+
+    @contextmanager
+    def reader(self):
+        """Empresta uma conexão somente leitura do pool."""
+        conn = self._take_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def dedicated_reader(self):
+        """Conexão somente leitura própria, fora do pool, para leituras longas (ex.: exportação em streaming).
+
+        Um cliente lento segura só esta conexão, sem esgotar as do pool.
+        """
+        conn = create_connection(self.db_file, readonly=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _take_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.read_pool_size
+            if create:
+                self._created += 1
+        if create:
+            return create_connection(self.db_file, readonly=True)
+        return self._readers.get()
+
+    @contextmanager
+    def writer(self):
+        """Dá acesso exclusivo à conexão de escrita."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = create_connection(self.db_file)
+            try:
+                yield self._writer
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+def _migrate_initial_schema(conn):
+    """v1: tabelas matches (nome "nome#tag" em texto), players, games e player_versions."""
     sql_create_matches_table = """
     CREATE TABLE IF NOT EXISTS matches (
         matchId TEXT,
@@ -26,36 +130,750 @@ def create_table(conn):
         doubleKills INTEGER,
         tripleKills INTEGER,
         goldEarned INTEGER,
+        puuid TEXT,
         PRIMARY KEY (matchId, Player_name)
     );
     """
+    sql_create_players_table = """
+    CREATE TABLE IF NOT EXISTS players (
+        player_id INTEGER PRIMARY KEY,
+        riot_id TEXT NOT NULL UNIQUE COLLATE NOCASE,
+        puuid TEXT UNIQUE,
+        region TEXT,
+        resolved_at INTEGER
+    );
+    """
+    sql_create_games_table = """
+    CREATE TABLE IF NOT EXISTS games (
+        matchId TEXT PRIMARY KEY,
+        gameCreation INTEGER,
+        gameDuration INTEGER,
+        gameVersion TEXT,
+        queueId INTEGER,
+        platformId TEXT,
+        gameMode TEXT
+    );
+    """
+    sql_create_versions_table = """
+    CREATE TABLE IF NOT EXISTS player_versions (
+        player_key TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    );
+    """
     conn.execute(sql_create_matches_table)
-    conn.commit()
+    conn.execute(sql_create_players_table)
+    conn.execute(sql_create_games_table)
+    conn.execute(sql_create_versions_table)
 
-def insert_matches(conn, data_list):
-    """Insere os dados de partidas no banco."""
+    # Bancos criados antes da coluna puuid
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(matches)")]
+    if "puuid" not in columns:
+        conn.execute("ALTER TABLE matches ADD COLUMN puuid TEXT")
+    # Uma partida por conta: com o nome trocado, o INSERT OR REPLACE substitui a linha antiga
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_match_puuid ON matches (matchId, puuid)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_puuid_creation ON matches (puuid, gameCreation)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_player_creation ON matches (Player_name, gameCreation)")
+
+def _migrate_compact_matches(conn):
+    """v2: partidas em match_stats, com chaves inteiras para jogador e campeão.
+
+    match_stats é WITHOUT ROWID e agrupada por (player_id, gameCreation DESC,
+    matchId DESC): o histórico de um jogador é um trecho contíguo da chave
+    primária, lido já na ordem das consultas, sem ordenação. matches vira uma
+    view com as colunas antigas.
+    """
+    # riot_id passa a aceitar NULL: conta cujo Riot ID foi assumido por outra
+    conn.execute("ALTER TABLE players RENAME TO players_v1")
+    conn.execute("""
+    CREATE TABLE players (
+        player_id INTEGER PRIMARY KEY,
+        riot_id TEXT UNIQUE COLLATE NOCASE,
+        puuid TEXT UNIQUE,
+        region TEXT,
+        resolved_at INTEGER
+    );
+    """)
+    conn.execute("INSERT INTO players SELECT player_id, riot_id, puuid, region, resolved_at FROM players_v1")
+    conn.execute("DROP TABLE players_v1")
+
+    conn.execute("""
+    CREATE TABLE champions (
+        champion_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    """)
+    conn.execute("""
+    CREATE TABLE match_stats (
+        player_id INTEGER NOT NULL REFERENCES players (player_id),
+        gameCreation INTEGER NOT NULL,
+        matchId TEXT NOT NULL,
+        champion_id INTEGER NOT NULL REFERENCES champions (champion_id),
+        kills INTEGER,
+        deaths INTEGER,
+        assists INTEGER,
+        win INTEGER NOT NULL CHECK (win IN (0, 1)),
+        gameDuration INTEGER,
+        bountyLevel INTEGER,
+        damageDealtToObjectives INTEGER,
+        doubleKills INTEGER,
+        tripleKills INTEGER,
+        goldEarned INTEGER,
+        PRIMARY KEY (player_id, gameCreation DESC, matchId DESC)
+    ) WITHOUT ROWID;
+    """)
+    # Participantes de uma partida; o índice já carrega a chave primária
+    conn.execute("CREATE INDEX idx_match_stats_match ON match_stats (matchId)")
+    # Vitórias por campeão sem tocar na tabela
+    conn.execute("CREATE INDEX idx_match_stats_champion ON match_stats (champion_id, gameCreation, win)")
+
+    conn.execute("ALTER TABLE matches RENAME TO matches_v1")
+    # A cópia é SQL puro, presa ao schema v2: não usa os helpers de gravação,
+    # que acompanham o schema atual. Mesmas regras de _player_ids na época:
+    # linhas sem PUUID são do Riot ID; uma conta nova assume o Riot ID (o da
+    # sua partida mais antiga) de um jogador sem PUUID, ou entra sem Riot ID
+    # se ele já for de outra conta; na disputa, vence a conta vista primeiro.
+    conn.execute("""
+    CREATE TEMP TABLE legacy_accounts AS
+    SELECT
+        puuid,
+        CASE WHEN Player_name <> '' AND Player_name NOT LIKE '#%' AND Player_name NOT LIKE '%#'
+            THEN Player_name END AS riot_id,
+        gameCreation AS first_seen,
+        row AS first_row
+    FROM (
+        SELECT puuid, Player_name, gameCreation, rowid AS row,
+            row_number() OVER (PARTITION BY puuid ORDER BY gameCreation, rowid) AS position
+        FROM matches_v1
+        WHERE puuid IS NOT NULL AND puuid NOT IN (SELECT puuid FROM players WHERE puuid IS NOT NULL)
+    )
+    WHERE position = 1
+    """)
+    conn.execute("""
+    CREATE INDEX temp.idx_legacy_accounts_riot_id ON legacy_accounts (riot_id COLLATE NOCASE, first_seen, first_row)
+    """)
+    # Um jogador por Riot ID novo; com o OR IGNORE, fica a grafia da primeira partida em que aparece
+    conn.execute("""
+    INSERT OR IGNORE INTO players (riot_id)
+    SELECT riot_id FROM (
+        SELECT Player_name AS riot_id, gameCreation AS seen, rowid AS row FROM matches_v1
+        WHERE puuid IS NULL AND Player_name IS NOT NULL
+        UNION ALL
+        SELECT riot_id, first_seen, first_row FROM temp.legacy_accounts WHERE riot_id IS NOT NULL
+    )
+    ORDER BY seen, row
+    """)
+    conn.execute("""
+    UPDATE players SET puuid = (
+        SELECT a.puuid FROM temp.legacy_accounts a
+        WHERE a.riot_id = players.riot_id COLLATE NOCASE
+        ORDER BY a.first_seen, a.first_row LIMIT 1
+    )
+    WHERE puuid IS NULL
+        AND EXISTS (SELECT 1 FROM temp.legacy_accounts a WHERE a.riot_id = players.riot_id COLLATE NOCASE)
+    """)
+    conn.execute("""
+    INSERT INTO players (puuid)
+    SELECT puuid FROM temp.legacy_accounts
+    WHERE puuid NOT IN (SELECT puuid FROM players WHERE puuid IS NOT NULL)
+    ORDER BY first_seen, first_row
+    """)
+    conn.execute("DROP TABLE temp.legacy_accounts")
+
+    conn.execute("""
+    INSERT OR IGNORE INTO champions (name) SELECT DISTINCT coalesce(championName, '') FROM matches_v1
+    """)
+    # Na mesma ordem da gravação original: para a mesma chave, fica a última linha
+    conn.execute("""
+    INSERT OR REPLACE INTO match_stats (
+        player_id, gameCreation, matchId, champion_id, kills, deaths, assists, win,
+        gameDuration, bountyLevel, damageDealtToObjectives, doubleKills, tripleKills, goldEarned
+    )
+    SELECT
+        CASE WHEN m.puuid IS NOT NULL
+            THEN (SELECT player_id FROM players WHERE puuid = m.puuid)
+            ELSE (SELECT player_id FROM players WHERE riot_id = m.Player_name)
+        END,
+        coalesce(m.gameCreation, 0), m.matchId, c.champion_id, m.kills, m.deaths, m.assists,
+        CASE WHEN m.win THEN 1 ELSE 0 END,
+        m.gameDuration, m.bountyLevel, m.damageDealtToObjectives, m.doubleKills, m.tripleKills, m.goldEarned
+    FROM matches_v1 m
+    JOIN champions c ON c.name = coalesce(m.championName, '')
+    WHERE m.puuid IS NOT NULL OR m.Player_name IS NOT NULL
+    ORDER BY m.gameCreation, m.rowid
+    """)
+    conn.execute("DROP TABLE matches_v1")
+
+    conn.execute("""
+    CREATE VIEW matches AS
+    SELECT
+        s.matchId AS matchId,
+        p.riot_id AS Player_name,
+        c.name AS championName,
+        s.kills AS kills,
+        s.deaths AS deaths,
+        s.assists AS assists,
+        s.win AS win,
+        s.gameCreation AS gameCreation,
+        s.gameDuration AS gameDuration,
+        s.bountyLevel AS bountyLevel,
+        s.damageDealtToObjectives AS damageDealtToObjectives,
+        s.doubleKills AS doubleKills,
+        s.tripleKills AS tripleKills,
+        s.goldEarned AS goldEarned,
+        p.puuid AS puuid
+    FROM match_stats s
+    JOIN players p ON p.player_id = s.player_id
+    JOIN champions c ON c.champion_id = s.champion_id
+    """)
+
+def _migrate_player_server(conn):
+    """v3: servidor (br, euw...) descoberto para a conta, usado pelo modo server="auto"."""
+    conn.execute("ALTER TABLE players ADD COLUMN server TEXT")
+
+def _migrate_timelines(conn):
+    """v4: curvas por minuto das partidas (timeline.pack_series), uma linha por partida e jogador.
+
+    Mesma chave de match_stats: as N timelines mais recentes de um jogador
+    são um trecho contíguo da chave primária.
+    """
+    conn.execute("""
+    CREATE TABLE match_timelines (
+        player_id INTEGER NOT NULL REFERENCES players (player_id),
+        gameCreation INTEGER NOT NULL,
+        matchId TEXT NOT NULL,
+        frame_interval INTEGER NOT NULL,
+        minutes INTEGER NOT NULL,
+        series BLOB NOT NULL,
+        PRIMARY KEY (player_id, gameCreation DESC, matchId DESC)
+    ) WITHOUT ROWID;
+    """)
+
+def _migrate_drop_stale_stats(conn):
+    """v5: apaga o sqlite_stat1 gravado pelo ANALYZE que rodava após as migrações.
+
+    As estatísticas ficavam congeladas no tamanho do banco na migração e, com
+    o banco crescendo, o planejador passava a varrer players e champions em
+    toda consulta por jogador. Sem elas, as consultas seguem a chave primária.
+    """
+    conn.execute("DROP TABLE IF EXISTS sqlite_stat1")
+
+def _migrate_write_seq(conn):
+    """v6: sequência de escrita em player_versions.
+
+    Cada gravação recebe um número maior que todos os anteriores, em todos os
+    processos (ele é tirado dentro da transação de escrita), e marca os
+    jogadores que mudaram: quem guarda o último número visto relê só esses.
+    """
+    conn.execute("ALTER TABLE player_versions ADD COLUMN write_seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX idx_player_versions_seq ON player_versions (write_seq)")
+
+# Cada função leva o schema da versão anterior (PRAGMA user_version) para a seguinte
+MIGRATIONS = (
+    _migrate_initial_schema,
+    _migrate_compact_matches,
+    _migrate_player_server,
+    _migrate_timelines,
+    _migrate_drop_stale_stats,
+    _migrate_write_seq,
+)
+
+@timed_sqlite
+def create_table(conn, timeout=None):
+    """Aplica as migrações pendentes do banco, cada uma na sua transação.
+
+    A versão é relida dentro de BEGIN IMMEDIATE, então vários processos
+    iniciando juntos não aplicam a mesma migração duas vezes. timeout (s)
+    substitui o busy timeout da conexão enquanto isso: quem chega durante a
+    migração de um banco grande espera por ela em vez de receber "database
+    is locked".
+    """
+    previous = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    if timeout is not None:
+        conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    try:
+        _apply_migrations(conn)
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {previous}")
+
+def _apply_migrations(conn):
+    migrated = False
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.commit()
+                break
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+            migrated = True
+        except Exception:
+            conn.rollback()
+            raise
+    if migrated:
+        # Devolve ao sistema as páginas das tabelas antigas
+        conn.execute("VACUUM")
+
+def _valid_riot_id(name):
+    return bool(name) and not name.startswith("#") and not name.endswith("#")
+
+def _player_ids(conn, data_list, claimed=None):
+    """player_id de cada linha, pela chave player_key(row), criando os jogadores que faltam.
+
+    Linhas com PUUID são da conta; as sem PUUID (antigas) são do Riot ID.
+    Uma conta nova assume o Riot ID de um jogador antigo sem PUUID e entra
+    sem Riot ID se ele já pertencer a outra conta. Os Riot IDs assumidos, cujas
+    partidas mudam de chave, entram em `claimed`.
+    """
+    ids = {}
+    for row in data_list:
+        key = player_key(row)
+        if key in ids:
+            continue
+        puuid = row[14]
+        riot_id = row[1] if _valid_riot_id(row[1]) or not puuid else None
+        found = None
+        if puuid:
+            found = conn.execute("SELECT player_id FROM players WHERE puuid = ?", (puuid,)).fetchone()
+        if found is None and riot_id:
+            holder = conn.execute(
+                "SELECT player_id, puuid, riot_id FROM players WHERE riot_id = ?", (riot_id,)
+            ).fetchone()
+            if holder is not None and (not puuid or holder[1] is None):
+                found = holder
+                if puuid:
+                    conn.execute("UPDATE players SET puuid = ? WHERE player_id = ?", (puuid, holder[0]))
+                    if claimed is not None:
+                        claimed.add(holder[2])
+            elif holder is not None:
+                riot_id = None
+        if found is None:
+            found = (conn.execute("INSERT INTO players (riot_id, puuid) VALUES (?, ?)", (riot_id, puuid)).lastrowid,)
+        ids[key] = found[0]
+    return ids
+
+def _champion_ids(conn, data_list):
+    conn.executemany("INSERT OR IGNORE INTO champions (name) VALUES (?)", [(name,) for name in {row[2] or "" for row in data_list}])
+    return dict(conn.execute("SELECT name, champion_id FROM champions"))
+
+def _store_match_rows(conn, data_list):
+    """Grava as tuplas de build_match_row em match_stats (sem versões nem commit).
+
+    Retorna os Riot IDs antigos assumidos por uma conta (ver _player_ids).
+    """
+    claimed = set()
+    players = _player_ids(conn, data_list, claimed)
+    champions = _champion_ids(conn, data_list)
     sql_insert = """
-    INSERT OR REPLACE INTO matches (
-        matchId, Player_name, championName, kills, deaths, assists, win,
-        gameCreation, gameDuration, bountyLevel, damageDealtToObjectives,
-        doubleKills, tripleKills, goldEarned
+    INSERT OR REPLACE INTO match_stats (
+        player_id, gameCreation, matchId, champion_id, kills, deaths, assists, win,
+        gameDuration, bountyLevel, damageDealtToObjectives, doubleKills, tripleKills, goldEarned
     )
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
-    conn.executemany(sql_insert, data_list)
+    conn.executemany(sql_insert, [
+        (players[player_key(row)], row[7] or 0, row[0], champions[row[2] or ""], row[3], row[4], row[5],
+         int(bool(row[6])), row[8], row[9], row[10], row[11], row[12], row[13])
+        for row in data_list
+    ])
+    return claimed
+
+def _insert_match_rows(conn, data_list):
+    claimed = _store_match_rows(conn, data_list)
+    metrics.SQLITE_ROWS.inc("matches", "written", amount=len(data_list))
+    bump_player_versions(conn, {player_key(row) for row in data_list} | claimed)
+
+def player_key(row):
+    """Chave de versão de uma linha de build_match_row: o PUUID, ou o nome para linhas antigas."""
+    return row[14] or row[1]
+
+def bump_player_versions(conn, player_keys):
+    """Incrementa a versão dos jogadores cujas partidas mudaram e marca a gravação com um novo write_seq (sem commit)."""
+    # Chamado dentro da transação de escrita, então dois processos nunca tiram o mesmo número
+    write_seq = conn.execute("SELECT coalesce(max(write_seq), 0) + 1 FROM player_versions").fetchone()[0]
+    conn.executemany("""
+    INSERT INTO player_versions (player_key, version, updated_at, write_seq) VALUES (?, 1, ?, ?)
+    ON CONFLICT (player_key) DO UPDATE SET
+        version = version + 1, updated_at = excluded.updated_at, write_seq = excluded.write_seq
+    """, [(key, int(time.time()), write_seq) for key in player_keys])
+
+@timed_sqlite
+def get_player_version(conn, player_name_with_tag):
+    """Retorna (player_key, version, updated_at) do jogador; version 0 se nada foi gravado."""
+    row = get_player(conn, player_name_with_tag)
+    key = row["puuid"] if row is not None and row["puuid"] else player_name_with_tag
+    version = conn.execute(
+        "SELECT version, updated_at FROM player_versions WHERE player_key = ?", (key,)
+    ).fetchone()
+    if version is None:
+        return key, 0, None
+    return key, version[0], version[1]
+
+@timed_sqlite
+def insert_matches(conn, data_list, commit=True):
+    """Insere os dados de partidas no banco."""
+    _insert_match_rows(conn, data_list)
+    if commit:
+        conn.commit()
+
+@timed_sqlite
+def insert_full_matches(conn, games, data_list, region, commit=True):
+    """Grava partidas completas (linha em games + dez participantes) numa única transação.
+
+    Os participantes também entram em players, com resolved_at na data da
+    partida, para que buscas por eles não precisem da chamada account-v1.
+    """
+    conn.executemany("INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?)", games)
+    conn.executemany(
+        "INSERT OR IGNORE INTO players (riot_id, puuid, region, resolved_at) VALUES (?, ?, ?, ?)",
+        [(row[1], row[14], region, row[7] // 1000) for row in data_list if row[14] and _valid_riot_id(row[1])],
+    )
+    _insert_match_rows(conn, data_list)
+    if commit:
+        conn.commit()
+
+@timed_sqlite
+def insert_timelines(conn, puuid, timelines, commit=True):
+    """Grava as timelines do jogador: tuplas (matchId, gameCreation, frame_interval, minutes, series)."""
+    row = conn.execute("SELECT player_id FROM players WHERE puuid = ?", (puuid,)).fetchone()
+    if row is None:
+        raise ValueError(f"Unknown player: {puuid}")
+    conn.executemany("""
+    INSERT OR REPLACE INTO match_timelines (player_id, matchId, gameCreation, frame_interval, minutes, series)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, [(row[0],) + tuple(timeline) for timeline in timelines])
+    metrics.SQLITE_ROWS.inc("match_timelines", "written", amount=len(timelines))
+    if commit:
+        conn.commit()
+
+@timed_sqlite
+def save_player(conn, riot_id, puuid, region, server=None):
+    """Grava (ou atualiza) o mapeamento Riot ID -> PUUID e associa as partidas antigas ao PUUID.
+
+    server, quando informado, fica guardado para as buscas com server="auto".
+    """
+    holder = conn.execute(
+        "SELECT player_id, puuid, riot_id FROM players WHERE riot_id = ? AND puuid IS NOT ?", (riot_id, puuid)
+    ).fetchone()
+    if holder is not None and holder["puuid"] is None:
+        # Partidas antigas gravadas só com o nome passam para a conta
+        own = conn.execute("SELECT player_id FROM players WHERE puuid = ?", (puuid,)).fetchone()
+        if own is None:
+            conn.execute("UPDATE players SET puuid = ? WHERE player_id = ?", (puuid, holder["player_id"]))
+        else:
+            conn.execute("UPDATE OR REPLACE match_stats SET player_id = ? WHERE player_id = ?",
+                         (own["player_id"], holder["player_id"]))
+            conn.execute("DELETE FROM players WHERE player_id = ?", (holder["player_id"],))
+        # As partidas saem da chave do nome e passam para a do PUUID
+        bump_player_versions(conn, [puuid, holder["riot_id"]])
+    elif holder is not None:
+        # O Riot ID passou para outra conta
+        conn.execute("UPDATE players SET riot_id = NULL WHERE player_id = ?", (holder["player_id"],))
+    conn.execute("""
+    INSERT INTO players (riot_id, puuid, region, resolved_at, server) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (puuid) DO UPDATE SET
+        riot_id = excluded.riot_id, region = excluded.region, resolved_at = excluded.resolved_at,
+        server = COALESCE(excluded.server, server)
+    """, (riot_id, puuid, region, int(time.time()), server))
     conn.commit()
 
+def get_player(conn, riot_id):
+    """Retorna a linha de players do Riot ID, ou None."""
+    return conn.execute(
+        "SELECT player_id, riot_id, puuid, region, resolved_at, server FROM players WHERE riot_id = ?", (riot_id,)
+    ).fetchone()
+
+class PuuidCache:
+    """LRU em memória na frente da tabela players, com TTL configurável.
+
+    Evita a chamada account-v1 enquanto o mapeamento Riot ID -> PUUID for recente.
+    """
+
+    def __init__(self, maxsize=1024, ttl=PUUID_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, resolved_at):
+        return resolved_at is not None and time.time() - resolved_at < self.ttl
+
+    def lookup(self, conn, riot_id, region):
+        """Retorna o PUUID em cache (memória ou banco) se ainda estiver dentro do TTL."""
+        key = (riot_id.lower(), region)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._fresh(entry[1]):
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        row = get_player(conn, riot_id)
+        if row is None or row["region"] != region or not self._fresh(row["resolved_at"]):
+            return None
+        self._remember(key, row["puuid"], row["resolved_at"])
+        return row["puuid"]
+
+    def store(self, conn, riot_id, puuid, region, server=None):
+        save_player(conn, riot_id, puuid, region, server)
+        self._remember((riot_id.lower(), region), puuid, time.time())
+
+    def resolve(self, pool, riot_id, region, fetch_puuid):
+        """Retorna o PUUID do cache ou, na falta dele, de fetch_puuid() (gravando o resultado)."""
+        with pool.reader() as conn:
+            puuid = self.lookup(conn, riot_id, region)
+        metrics.cache_result("puuid", puuid is not None)
+        if puuid is None:
+            puuid = fetch_puuid()
+            if puuid:
+                with pool.writer() as conn:
+                    self.store(conn, riot_id, puuid, region)
+        return puuid
+
+    def _remember(self, key, puuid, resolved_at):
+        with self._lock:
+            self._entries[key] = (puuid, resolved_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+def _player_filter(player_name_with_tag):
+    """Filtro WHERE das partidas do jogador na view matches.
+
+    O Riot ID leva ao player_id pelo índice de players e dali ao trecho do
+    jogador em match_stats, já em ordem de gameCreation decrescente.
+    """
+    return "Player_name = ?", (player_name_with_tag,)
+
+@timed_sqlite
+def get_latest_match(conn, player_name_with_tag):
+    """Retorna (matchId, gameCreation) da partida mais recente do jogador no banco, ou None."""
+    where, params = _player_filter(player_name_with_tag)
+    sql_select = f"""
+    SELECT matchId, gameCreation FROM matches
+    WHERE {where} ORDER BY gameCreation DESC LIMIT 1
+    """
+    row = conn.execute(sql_select, params).fetchone()
+    return (row[0], row[1]) if row else None
+
+@timed_sqlite
 def query_player_matches(conn, player_name_with_tag):
     """Busca todas as partidas de um jogador no banco."""
-    sql_select = """
-    SELECT * FROM matches WHERE Player_name = ? ORDER BY gameCreation DESC
+    where, params = _player_filter(player_name_with_tag)
+    sql_select = f"""
+    SELECT * FROM matches WHERE {where} ORDER BY gameCreation DESC
     """
-    cursor = conn.execute(sql_select, (player_name_with_tag,))
+    cursor = conn.execute(sql_select, params)
     
     # Converter os resultados para uma lista de dicionários
     columns = [column[0] for column in cursor.description]
     result = []
     for row in cursor.fetchall():
         result.append(dict(zip(columns, row)))
+    metrics.SQLITE_ROWS.inc("matches", "read", amount=len(result))
     
-    return result if result else []
\ No newline at end of file
+    return result if result else []
+
+def encode_cursor(game_creation, match_id):
+    return f"{game_creation}:{match_id}"
+
+def decode_cursor(cursor):
+    """Converte o cursor "gameCreation:matchId" de volta na tupla; ValueError se inválido."""
+    game_creation, _, match_id = cursor.partition(":")
+    if not match_id:
+        raise ValueError("Invalid cursor")
+    return int(game_creation), match_id
+
+@timed_sqlite
+def query_player_matches_json(conn, player_name_with_tag, fields=None, limit=None, cursor=None):
+    """Busca uma página das partidas do jogador já serializada como JSON.
+
+    A paginação é por keyset em (gameCreation, matchId): `cursor` é o valor
+    devolvido pela página anterior. `fields` restringe as colunas retornadas.
+    Retorna (json_text, next_cursor), com next_cursor None na última página.
+    """
+    fields = list(fields or MATCH_COLUMNS)
+    unknown = [field for field in fields if field not in MATCH_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    where, params = _player_filter(player_name_with_tag)
+    params = list(params)
+    if cursor:
+        where += " AND (gameCreation, matchId) < (?, ?)"
+        params.extend(decode_cursor(cursor))
+    limit_sql = ""
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        limit_sql = "LIMIT ?"
+        params.append(limit)
+
+    # O próprio SQLite monta o objeto JSON de cada linha
+    json_object = ", ".join(f"'{field}', {field}" for field in fields)
+    sql_select = f"""
+    SELECT json_object({json_object}), gameCreation, matchId FROM matches
+    WHERE {where} ORDER BY gameCreation DESC, matchId DESC {limit_sql}
+    """
+    rows = conn.execute(sql_select, params).fetchall()
+    metrics.SQLITE_ROWS.inc("matches", "read", amount=len(rows))
+
+    next_cursor = None
+    if limit is not None and len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][2])
+    return "[" + ",".join(row[0] for row in rows) + "]", next_cursor
+
+@timed_sqlite
+def missing_timelines(conn, player_name_with_tag, last=10):
+    """Das `last` partidas mais recentes do jogador, as que ainda não têm timeline: [(matchId, gameCreation)]."""
+    rows = conn.execute("""
+    WITH recent AS (
+        SELECT s.player_id, s.gameCreation, s.matchId
+        FROM match_stats s JOIN players p ON p.player_id = s.player_id
+        WHERE p.riot_id = ? ORDER BY s.gameCreation DESC, s.matchId DESC LIMIT ?
+    )
+    SELECT r.matchId, r.gameCreation FROM recent r
+    WHERE NOT EXISTS (
+        SELECT 1 FROM match_timelines t
+        WHERE t.player_id = r.player_id AND t.gameCreation = r.gameCreation AND t.matchId = r.matchId
+    )
+    """, (player_name_with_tag, last)).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+@timed_sqlite
+def query_player_timelines(conn, player_name_with_tag, last=10):
+    """As `last` timelines mais recentes do jogador: linhas (matchId, gameCreation, frame_interval, minutes, series)."""
+    rows = conn.execute("""
+    SELECT t.matchId, t.gameCreation, t.frame_interval, t.minutes, t.series
+    FROM match_timelines t JOIN players p ON p.player_id = t.player_id
+    WHERE p.riot_id = ? ORDER BY t.gameCreation DESC, t.matchId DESC LIMIT ?
+    """, (player_name_with_tag, last)).fetchall()
+    metrics.SQLITE_ROWS.inc("match_timelines", "read", amount=len(rows))
+    return rows
+
+def iter_matches(conn, player_name_with_tag=None, champion=None, platform=None, start=None, end=None,
+                 batch_size=1000):
+    """Percorre as partidas filtradas em lotes de fetchmany, com memória constante.
+
+    Gera listas de tuplas na ordem de MATCH_COLUMNS, agrupadas por jogador e da
+    mais recente para a mais antiga. platform ("br1", "euw1"...) filtra pelo
+    prefixo do matchId; start/end filtram gameCreation (ms).
+    """
+    where, params = ["1"], []
+    if player_name_with_tag:
+        where.append("p.riot_id = ?")
+        params.append(player_name_with_tag)
+    if champion:
+        where.append("c.name = ?")
+        params.append(champion)
+    if platform:
+        where.append("s.matchId LIKE ? ESCAPE '\\'")
+        params.append(f"{platform}\\_%")
+    if start is not None:
+        where.append("s.gameCreation >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("s.gameCreation < ?")
+        params.append(end)
+
+    # Direto nas tabelas e na ordem da chave primária de match_stats: sem filtro
+    # por campeão o planejador percorre a própria tabela, sem ordenar
+    cursor = conn.execute(f"""
+    SELECT s.matchId, p.riot_id, c.name, s.kills, s.deaths, s.assists, s.win, s.gameCreation, s.gameDuration,
+        s.bountyLevel, s.damageDealtToObjectives, s.doubleKills, s.tripleKills, s.goldEarned, p.puuid
+    FROM match_stats s
+    JOIN players p ON p.player_id = s.player_id
+    JOIN champions c ON c.champion_id = s.champion_id
+    WHERE {' AND '.join(where)}
+    ORDER BY s.player_id, s.gameCreation DESC, s.matchId DESC
+    """, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        metrics.SQLITE_ROWS.inc("matches", "read", amount=len(rows))
+        yield rows
+
+def last_write_seq(conn):
+    """Maior write_seq gravado (0 se nada foi gravado)."""
+    return conn.execute("SELECT coalesce(max(write_seq), 0) FROM player_versions").fetchone()[0]
+
+def changed_player_keys(conn, since_seq):
+    """player_key dos jogadores gravados depois de since_seq."""
+    return [row[0] for row in conn.execute("SELECT player_key FROM player_versions WHERE write_seq > ?", (since_seq,))]
+
+def iter_changed_matches(conn, since_seq, batch_size=1000):
+    """Todas as partidas (ordem de MATCH_COLUMNS) dos jogadores gravados depois de since_seq, em lotes.
+
+    A chave é o PUUID ou, para linhas antigas, o Riot ID (player_key).
+    """
+    cursor = conn.execute("""
+    WITH changed (player_id) AS (
+        SELECT p.player_id FROM player_versions v JOIN players p ON p.puuid = v.player_key
+        WHERE v.write_seq > ?
+        UNION
+        SELECT p.player_id FROM player_versions v JOIN players p ON p.riot_id = v.player_key
+        WHERE v.write_seq > ? AND p.puuid IS NULL
+    )
+    SELECT s.matchId, p.riot_id, c.name, s.kills, s.deaths, s.assists, s.win, s.gameCreation, s.gameDuration,
+        s.bountyLevel, s.damageDealtToObjectives, s.doubleKills, s.tripleKills, s.goldEarned, p.puuid
+    FROM changed
+    JOIN match_stats s ON s.player_id = changed.player_id
+    JOIN players p ON p.player_id = s.player_id
+    JOIN champions c ON c.champion_id = s.champion_id
+    """, (since_seq, since_seq))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        metrics.SQLITE_ROWS.inc("matches", "read", amount=len(rows))
+        yield rows
+
+@timed_sqlite
+def query_player_stats(conn, player_name_with_tag, by_champion=False, start=None, end=None, last=None):
+    """Calcula no SQL as médias e a taxa de vitória das partidas de um jogador.
+
+    start/end filtram gameCreation (ms) e last limita às N partidas mais recentes.
+    """
+    where, params = _player_filter(player_name_with_tag)
+    params = list(params)
+    if start is not None:
+        where += " AND gameCreation >= ?"
+        params.append(start)
+    if end is not None:
+        where += " AND gameCreation < ?"
+        params.append(end)
+    limit = ""
+    if last is not None:
+        limit = "LIMIT ?"
+        params.append(last)
+
+    aggregates = """
+        COUNT(*) AS games,
+        AVG(kills) AS kills,
+        AVG(deaths) AS deaths,
+        AVG(assists) AS assists,
+        AVG(goldEarned) AS goldEarned,
+        AVG(damageDealtToObjectives) AS damageDealtToObjectives,
+        AVG(bountyLevel) AS bountyLevel,
+        AVG(gameDuration) AS gameDuration,
+        AVG(win) * 100 AS winRate
+    """
+    recent = f"""
+    WITH recent AS (
+        SELECT * FROM matches WHERE {where} ORDER BY gameCreation DESC {limit}
+    )
+    """
+    overall = conn.execute(f"{recent} SELECT {aggregates} FROM recent", params).fetchone()
+    result = {"player": player_name_with_tag, "overall": dict(overall)}
+    metrics.SQLITE_ROWS.inc("matches", "read", amount=overall["games"])
+
+    if by_champion:
+        sql_champions = f"""
+        {recent}
+        SELECT championName, {aggregates} FROM recent
+        GROUP BY championName ORDER BY games DESC, championName
+        """
+        result["champions"] = [dict(row) for row in conn.execute(sql_champions, params)]
+
+    return result
@@ -0,0 +1,82 @@
+# export.py
+
+"""
+Exportação das partidas em NDJSON (um objeto JSON por linha) ou CSV, em streaming.
+
+As linhas saem do cursor em lotes (fetchmany) e cada lote vira um pedaço de
+texto, então a memória não cresce com o tamanho do banco. A mesma função
+alimenta GET /export e a linha de comando:
+    python export.py --format csv --champion Vi --server br --output vi.csv
+    python export.py --player "Monochaco#BR1" --start 1700000000000 > partidas.ndjson
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from database import ConnectionPool, MATCH_COLUMNS, create_table, iter_matches
+from call_champions import SERVER_MAPPINGS
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_chunks(conn, fmt="ndjson", batch_size=1000, **filters):
+    """Gera o texto exportado, um pedaço por lote de partidas.
+
+    filters são os de iter_matches (player_name_with_tag, champion, platform, start, end).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(MATCH_COLUMNS)
+        yield buffer.getvalue()
+
+    for rows in iter_matches(conn, batch_size=batch_size, **filters):
+        if fmt == "csv":
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(dict(zip(MATCH_COLUMNS, row)), separators=(",", ":")) + "\n" for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta as partidas do banco em NDJSON ou CSV.")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "mydatabase.db"), help="arquivo do banco")
+    parser.add_argument("--player", help='Riot ID "nome#tag"')
+    parser.add_argument("--champion", help="nome do campeão (ex.: LeeSin)")
+    parser.add_argument("--server", choices=sorted(SERVER_MAPPINGS), help="servidor das partidas")
+    parser.add_argument("--start", type=int, help="gameCreation mínimo (ms)")
+    parser.add_argument("--end", type=int, help="gameCreation máximo, exclusivo (ms)")
+    parser.add_argument("--output", help="arquivo de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    db = ConnectionPool(args.db, read_pool_size=1)
+    with db.writer() as conn:
+        create_table(conn)
+    platform = SERVER_MAPPINGS[args.server]["region"] if args.server else None
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        with db.reader() as conn:
+            for chunk in export_chunks(conn, args.format, player_name_with_tag=args.player, champion=args.champion,
+                                       platform=platform, start=args.start, end=args.end):
+                output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
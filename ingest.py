@@ -0,0 +1,178 @@
+# ingest.py
+
+"""
+Ingestão em lote de vários jogadores, para pré-carregar o banco sem passar pela API Flask.
+
+Uso:
+    python ingest.py jogadores.txt --count 20
+
+Cada linha do arquivo tem um Riot ID e, opcionalmente, o servidor (padrão br):
+    Monochaco#BR1 br
+    Faker#KR1,kr
+    Hide on bush#KR1 kr
+
+O progresso fica gravado no banco junto com as partidas, então uma execução
+interrompida continua de onde parou ao ser repetida.
+"""
+
+import argparse
+import logging
+import os
+import queue
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from database import ConnectionPool, create_table, insert_matches, insert_full_matches, PuuidCache
+from call_champions import fetch_jungle_data, fetch_full_match_data, get_puuid_by_riot_id, riot_client, SERVER_MAPPINGS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def create_progress_table(conn):
+    """Cria a tabela que registra os jogadores já ingeridos."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_progress (
+        riot_id TEXT NOT NULL COLLATE NOCASE,
+        server TEXT NOT NULL,
+        status TEXT NOT NULL,
+        matches INTEGER NOT NULL,
+        finished_at INTEGER NOT NULL,
+        PRIMARY KEY (riot_id, server)
+    );
+    """)
+    conn.commit()
+
+
+def split_server(line):
+    """Separa (riot_id, servidor) do fim da linha: o nome pode ter espaços, o servidor não."""
+    if "," in line:
+        riot_id, _, server = line.rpartition(",")
+        return riot_id.strip(), server.strip().lower()
+    # A tag não tem espaços: se a última palavra não tem "#", ela é o servidor
+    parts = line.rsplit(maxsplit=1)
+    if len(parts) == 2 and "#" not in parts[1]:
+        return parts[0], parts[1].lower()
+    return line, ""
+
+
+def read_players(path):
+    """Lê o arquivo de jogadores e retorna uma lista de (game_name, tag_line, server)."""
+    players = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            riot_id, server = split_server(line)
+            game_name, _, tag_line = riot_id.rpartition("#")
+            server = server or "br"
+            if not game_name or not tag_line or server not in SERVER_MAPPINGS:
+                logger.warning(f"Linha {line_number} ignorada: {line!r}")
+                continue
+            players.append((game_name, tag_line, server))
+    return players
+
+
+def ingest(players, db, count=20, workers_per_region=4, batch_rows=5000, full=False):
+    """Busca os jogadores em paralelo por região de roteamento e grava em lotes grandes.
+
+    Com full=True grava os dez participantes de cada partida.
+    """
+    with db.reader() as conn:
+        done = {(row[0].lower(), row[1]) for row in conn.execute("SELECT riot_id, server FROM ingest_progress")}
+    pending = [p for p in players if (f"{p[0]}#{p[1]}".lower(), p[2]) not in done]
+    logger.info(f"{len(players) - len(pending)} jogadores já ingeridos, {len(pending)} pendentes")
+
+    by_region = defaultdict(list)
+    for player in pending:
+        by_region[SERVER_MAPPINGS[player[2]]["routing"]].append(player)
+
+    puuid_cache = PuuidCache()
+    results = queue.Queue()
+
+    def fetch(game_name, tag_line, server_code):
+        routing_region = SERVER_MAPPINGS[server_code]["routing"]
+        try:
+            puuid = puuid_cache.resolve(
+                db, f"{game_name}#{tag_line}", routing_region,
+                lambda: get_puuid_by_riot_id(game_name, tag_line, routing_region),
+            )
+            games, data_list = [], []
+            if puuid and full:
+                games, data_list, _ = fetch_full_match_data(game_name, tag_line, server_code, count=count, puuid=puuid)
+            elif puuid:
+                data_list = fetch_jungle_data(game_name, tag_line, server_code, count=count, puuid=puuid)
+            results.put((game_name, tag_line, server_code, "done" if data_list else "not_found", games, data_list))
+        except Exception as e:
+            logger.error(f"Erro ao buscar {game_name}#{tag_line}: {e}")
+            results.put((game_name, tag_line, server_code, "error", [], []))
+
+    # Um pool por região: cada região tem sua própria cota na API da Riot
+    executors = [ThreadPoolExecutor(max_workers=workers_per_region, thread_name_prefix=f"ingest-{region}")
+                 for region in by_region]
+    for executor, region_players in zip(executors, by_region.values()):
+        for player in region_players:
+            executor.submit(fetch, *player)
+
+    total_rows = 0
+    batch, batch_games, batch_players = defaultdict(list), defaultdict(list), []
+    started = time.monotonic()
+    for finished in range(1, len(pending) + 1):
+        game_name, tag_line, server_code, status, games, data_list = results.get()
+        routing_region = SERVER_MAPPINGS[server_code]["routing"]
+        batch[routing_region].extend(data_list)
+        batch_games[routing_region].extend(games)
+        # Erros não são marcados, para serem tentados de novo na próxima execução
+        if status != "error":
+            batch_players.append((f"{game_name}#{tag_line}", server_code, status, len(data_list), int(time.time())))
+        batch_size = sum(len(rows) for rows in batch.values())
+        if batch_size >= batch_rows or finished == len(pending):
+            with db.writer() as conn:
+                # O progresso vai na mesma transação das partidas
+                conn.executemany("INSERT OR REPLACE INTO ingest_progress VALUES (?, ?, ?, ?, ?)", batch_players)
+                for region, rows in batch.items():
+                    if full:
+                        insert_full_matches(conn, batch_games[region], rows, region, commit=False)
+                    else:
+                        insert_matches(conn, rows, commit=False)
+                conn.commit()
+            total_rows += batch_size
+            logger.info(f"{finished}/{len(pending)} jogadores, {total_rows} partidas gravadas "
+                        f"({time.monotonic() - started:.1f}s)")
+            batch, batch_games, batch_players = defaultdict(list), defaultdict(list), []
+
+    for executor in executors:
+        executor.shutdown()
+    return total_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão em lote de jogadores no banco SQLite.")
+    parser.add_argument("players_file", help="arquivo com um Riot ID (e servidor) por linha")
+    parser.add_argument("--count", type=int, default=20, help="partidas por jogador")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "mydatabase.db"), help="arquivo do banco")
+    parser.add_argument("--workers-per-region", type=int, default=4, help="jogadores simultâneos por região")
+    parser.add_argument("--batch-rows", type=int, default=5000, help="partidas por transação")
+    parser.add_argument("--full", action="store_true", help="grava os dez participantes de cada partida")
+    parser.add_argument("--restart", action="store_true", help="ignora o progresso salvo e ingere tudo de novo")
+    args = parser.parse_args()
+
+    db = ConnectionPool(args.db)
+    with db.writer() as conn:
+        create_table(conn)
+        create_progress_table(conn)
+        if args.restart:
+            conn.execute("DELETE FROM ingest_progress")
+            conn.commit()
+
+    players = read_players(args.players_file)
+    total_rows = ingest(players, db, count=args.count, workers_per_region=args.workers_per_region,
+                        batch_rows=args.batch_rows, full=args.full)
+    logger.info(f"Ingestão concluída: {total_rows} partidas gravadas. Riot API: {riot_client.stats()}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# jobs.py
+
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def create_jobs_table(conn):
+    """Cria a tabela da fila de jobs, se ela ainda não existir."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id INTEGER PRIMARY KEY,
+        job_key TEXT NOT NULL,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        progress_done INTEGER NOT NULL DEFAULT 0,
+        progress_total INTEGER,
+        result TEXT,
+        error TEXT,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, job_id)")
+    # No máximo um job pendente por chave: pedidos repetidos reaproveitam o mesmo job
+    conn.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_key ON jobs (job_key)
+    WHERE status IN ('queued', 'running')
+    """)
+    conn.commit()
+
+
+class JobQueue:
+    """Fila persistente de jobs em SQLite, executada por um pool de threads.
+
+    handler(payload, progress) faz o trabalho e retorna um dict serializável
+    em JSON; progress(done, total) atualiza o andamento visto em GET /jobs/<id>.
+    Enquanto um job roda, uma thread renova o seu updated_at a cada
+    stale_after / 3 segundos, em qualquer etapa do handler: só jobs de
+    processos mortos ficam parados por stale_after e voltam para a fila.
+    """
+
+    def __init__(self, pool, handler, workers=2, poll_interval=1.0, stale_after=300):
+        self.pool = pool
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        """Cria a tabela e inicia os workers."""
+        with self.pool.writer() as conn:
+            create_jobs_table(conn)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def enqueue(self, job_key, payload):
+        """Enfileira um job, ou retorna o job pendente de mesma chave.
+
+        Retorna (job_id, created).
+        """
+        now = int(time.time())
+        with self.pool.writer() as conn:
+            # A busca e o INSERT na mesma transação de escrita: dois processos com o mesmo
+            # pedido não enxergam ambos "nenhum job pendente" (o segundo violaria idx_jobs_active_key)
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE job_key = ? AND status IN ('queued', 'running')",
+                (job_key,),
+            ).fetchone()
+            if row is not None:
+                conn.rollback()
+                return row[0], False
+            cursor = conn.execute(
+                "INSERT INTO jobs (job_key, status, payload, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_key, json.dumps(payload), now, now),
+            )
+            conn.commit()
+            job_id = cursor.lastrowid
+        self._wakeup.set()
+        return job_id, True
+
+    def get(self, job_id):
+        """Retorna o estado do job como dict, ou None se ele não existir."""
+        with self.pool.reader() as conn:
+            row = conn.execute(
+                """SELECT job_id, status, progress_done, progress_total, result, error, created_at, updated_at
+                FROM jobs WHERE job_id = ?""",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _claim(self):
+        now = int(time.time())
+        with self.pool.writer() as conn:
+            # Jobs sem heartbeat há muito tempo ficaram órfãos (processo reiniciado); voltam para a fila.
+            # Pelo tempo, e não no start(), para não roubar jobs de outros processos vivos
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (now, now - self.stale_after),
+            )
+            row = conn.execute(
+                """UPDATE jobs SET status = 'running', updated_at = ?
+                WHERE job_id = (SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1)
+                RETURNING job_id, payload""",
+                (now,),
+            ).fetchone()
+            conn.commit()
+        return row
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = int(time.time())
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.pool.writer() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+            conn.commit()
+
+    def _heartbeat(self):
+        while not self._stopping.wait(self.stale_after / 3):
+            with self._running_lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            now = int(time.time())
+            try:
+                with self.pool.writer() as conn:
+                    conn.executemany(
+                        "UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = 'running'",
+                        [(now, job_id) for job_id in job_ids],
+                    )
+                    conn.commit()
+            except Exception as e:
+                logger.error(f"Erro ao renovar os jobs em execução: {e}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                row = self._claim()
+            except Exception as e:
+                logger.error(f"Erro ao buscar job na fila: {e}")
+                row = None
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = row[0], json.loads(row[1])
+
+            def progress(done, total, job_id=job_id):
+                self._update(job_id, progress_done=done, progress_total=total)
+
+            with self._running_lock:
+                self._running.add(job_id)
+            try:
+                result = self.handler(payload, progress)
+                self._update(job_id, status="done", result=json.dumps(result))
+            except Exception as e:
+                logger.error(f"Erro no job {job_id}: {e}")
+                self._update(job_id, status="failed", error=str(e))
+            finally:
+                with self._running_lock:
+                    self._running.discard(job_id)
@@ -0,0 +1,66 @@
+# match_cache.py
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+import metrics
+
+
+class MatchCache:
+    """Cache local dos payloads brutos de partidas (match-v5), indexado por matchId.
+
+    Uma partida encerrada nunca muda, então o JSON é guardado comprimido
+    (zlib) e reaproveitado para sempre, inclusive para extrair os dados dos
+    outros participantes sem nova chamada à API.
+    """
+
+    def __init__(self, db_file="matchcache.db"):
+        self.db_file = db_file
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS match_payloads (
+                matchId TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                fetched_at INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, match_id):
+        """Retorna o payload da partida, ou None se ela ainda não foi baixada."""
+        with self._lock, metrics.timer("sqlite", metrics.SQLITE_DURATION, "match_cache.get"):
+            row = self._connection().execute(
+                "SELECT payload FROM match_payloads WHERE matchId = ?", (match_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, match_id, payload):
+        """Guarda o payload comprimido da partida."""
+        blob = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        with self._lock, metrics.timer("sqlite", metrics.SQLITE_DURATION, "match_cache.put"):
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO match_payloads (matchId, payload, fetched_at) VALUES (?, ?, ?)",
+                (match_id, blob, int(time.time())),
+            )
+            conn.commit()
+
+    def __contains__(self, match_id):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM match_payloads WHERE matchId = ?", (match_id,)
+            ).fetchone()
+        return row is not None
@@ -0,0 +1,182 @@
+# metrics.py
+
+"""
+Métricas em memória no formato de texto do Prometheus (exportadas em GET /metrics).
+
+Também acumula, por requisição, o tempo gasto em cada categoria (riot, sqlite,
+json), devolvido no cabeçalho Server-Timing quando o cliente envia X-Trace: 1.
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_stats = []
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        label_values = tuple(str(value) for value in label_values)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        label_values = tuple(str(label) for label in label_values)
+        with self._lock:
+            counts, total = self._values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labels + ("le",), label_values + (le,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def register_stats(name, documentation, label, stats):
+    """Exporta como contador um dict de totais mantido por outro objeto (ex.: RiotClient.stats)."""
+    _stats.append((name, documentation, label, stats))
+
+
+def render():
+    """Todas as métricas no formato de texto do Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for name, documentation, label, stats in _stats:
+        lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} counter"])
+        for key, value in sorted(stats().items()):
+            lines.append(f"{name}{_format_labels((label,), (key,))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Duração das requisições HTTP.",
+                          ("method", "route", "status"))
+SQLITE_DURATION = Histogram("sqlite_operation_duration_seconds", "Duração das operações no SQLite.",
+                            ("operation",))
+SQLITE_WRITE_BATCH = Histogram("sqlite_write_batch_rows", "Linhas gravadas por transação da fila de escrita.",
+                               buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000))
+SQLITE_ROWS = Counter("sqlite_rows_total", "Linhas lidas e gravadas no SQLite.", ("table", "direction"))
+RIOT_DURATION = Histogram("riot_request_duration_seconds", "Duração das chamadas à API da Riot.", ("method",))
+RIOT_RESPONSES = Counter("riot_responses_total", "Respostas da API da Riot por status.", ("method", "status"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Consultas aos caches internos.", ("cache", "result"))
+
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def start_trace():
+    """Começa a acumular os tempos por categoria da requisição atual.
+
+    Chamado a cada requisição: a thread do servidor pode ser reaproveitada e
+    o trace anterior não pode vazar para a próxima.
+    """
+    trace = {"_lock": threading.Lock()}
+    _trace.set(trace)
+    return trace
+
+
+def add_time(category, seconds):
+    trace = _trace.get()
+    if trace is not None:
+        with trace["_lock"]:
+            trace[category] = trace.get(category, 0.0) + seconds
+
+
+@contextmanager
+def timer(category, histogram=None, *label_values):
+    """Mede o bloco: observa no histograma (se houver) e soma ao trace da requisição."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if histogram is not None:
+            histogram.observe(elapsed, *label_values)
+        add_time(category, elapsed)
+
+
+def timed_sqlite(function):
+    """Decorador que mede uma função de database.py."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with timer("sqlite", SQLITE_DURATION, function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def with_trace(function):
+    """Faz a função, quando executada em outra thread (ex.: executor), somar ao trace da requisição atual."""
+    trace = _trace.get()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _trace.set(trace)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _trace.reset(token)
+    return wrapper
+
+
+def server_timing(total):
+    """Cabeçalho Server-Timing com o tempo acumulado (ms) por categoria da requisição atual.
+
+    Chamadas paralelas somam seus tempos, então "riot" pode passar de "total".
+    """
+    trace = _trace.get() or {}
+    parts = [f"{category};dur={seconds * 1000:.1f}"
+             for category, seconds in trace.items() if category != "_lock"]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,59 @@
+# response_cache.py
+
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """LRU de corpos de resposta já serializados, limitado pelo total de bytes.
+
+    Cada entrada guarda a versão do jogador com que foi gerada; uma versão
+    diferente é tratada como ausência. invalidate() descarta as entradas de
+    um jogador assim que novas partidas dele são gravadas.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._by_player = {}
+        self._lock = threading.Lock()
+
+    def get(self, player_key, request_key, version):
+        """Retorna (corpo, cabeçalhos) em cache para essa versão do jogador, ou None."""
+        key = (player_key, request_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, player_key, request_key, version, body, headers=None):
+        if len(body) > self.max_bytes:
+            return
+        key = (player_key, request_key)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (version, body, headers or {})
+            self._by_player.setdefault(player_key, set()).add(request_key)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, player_key):
+        """Descarta todas as respostas em cache de um jogador."""
+        with self._lock:
+            for request_key in list(self._by_player.get(player_key, ())):
+                self._discard((player_key, request_key))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[1])
+        request_keys = self._by_player.get(key[0])
+        if request_keys is not None:
+            request_keys.discard(key[1])
+            if not request_keys:
+                del self._by_player[key[0]]
@@ -0,0 +1,267 @@
+# riot_client.py
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+try:
+    import httpx
+except ImportError:  # só é necessário no modo assíncrono (RIOT_ASYNC=1)
+    httpx = None
+
+# O httpx registra cada requisição em INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Limites de uma chave de desenvolvimento; substituídos pelos cabeçalhos da Riot
+DEFAULT_APP_LIMIT = "20:1,100:120"
+DEFAULT_METHOD_LIMIT = "2000:10"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Pode apontar para um servidor local (ex.: bench/fake_riot.py): "http://127.0.0.1:8080/{routing}"
+BASE_URL = os.getenv("RIOT_API_BASE_URL", "https://{routing}.api.riotgames.com")
+
+
+def parse_rate_limit(header):
+    """Converte um cabeçalho como "20:1,100:120" em pares (limite, janela em segundos)."""
+    windows = []
+    for part in (header or "").split(","):
+        try:
+            limit, seconds = part.strip().split(":")
+            windows.append((int(limit), int(seconds)))
+        except ValueError:
+            continue
+    return windows
+
+
+class RateLimitBucket:
+    """Conjunto de janelas de limite (ex.: 20 req/1s e 100 req/120s) de uma chave.
+
+    Cada janela funciona como um balde de tokens: cada requisição consome um
+    token, que volta ao balde quando sai da janela deslizante.
+    """
+
+    def __init__(self, header):
+        self.windows = []
+        self.blocked_until = 0.0
+        self.update(header)
+
+    def update(self, header):
+        """Atualiza as janelas com os limites informados pela Riot."""
+        windows = parse_rate_limit(header)
+        if not windows or [w[:2] for w in self.windows] == windows:
+            return
+        old = {seconds: sent for _, seconds, sent in self.windows}
+        self.windows = [(limit, seconds, old.get(seconds, [])) for limit, seconds in windows]
+
+    def sync(self, count_header, now):
+        """Ajusta o uso local quando a Riot contabilizou mais requisições que nós."""
+        counts = {seconds: used for used, seconds in parse_rate_limit(count_header)}
+        for _, seconds, sent in self.windows:
+            missing = counts.get(seconds, 0) - len(sent)
+            if missing > 0:
+                sent.extend([now] * missing)
+
+    def wait_time(self, now):
+        """Segundos até haver um token livre em todas as janelas (0 se já houver)."""
+        wait = max(0.0, self.blocked_until - now)
+        for limit, seconds, sent in self.windows:
+            while sent and sent[0] <= now - seconds:
+                sent.pop(0)
+            if len(sent) >= limit:
+                wait = max(wait, sent[len(sent) - limit] + seconds - now)
+        return wait
+
+    def consume(self, now):
+        for _, _, sent in self.windows:
+            sent.append(now)
+
+
+class RiotClient:
+    """Cliente da API da Riot compartilhado por todos os helpers get_*.
+
+    Mantém um balde por região de roteamento (limite da aplicação) e um por
+    (região, método), agenda as requisições para não estourar a cota e faz
+    backoff/retentativas em 429 e erros 5xx.
+    """
+
+    def __init__(self, api_key=None, max_retries=3, pool_size=8, timeout=10, base_url=BASE_URL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._async_clients = {}
+        self._app_buckets = {}
+        self._method_buckets = {}
+        self._counters = {"requests": 0, "queued": 0, "throttled": 0, "retried": 0}
+
+    def session(self, routing_region):
+        """Retorna a sessão HTTP (keep-alive) compartilhada de uma região de roteamento."""
+        with self._lock:
+            session = self._sessions.get(routing_region)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[routing_region] = session
+            return session
+
+    def async_session(self, routing_region, max_connections=100):
+        """Cliente httpx assíncrono da região; deve ser usado sempre no mesmo event loop."""
+        if httpx is None:
+            raise RuntimeError("O modo assíncrono precisa do pacote httpx (pip install httpx)")
+        with self._lock:
+            client = self._async_clients.get(routing_region)
+            if client is None:
+                limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+                client = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+                self._async_clients[routing_region] = client
+            return client
+
+    def stats(self):
+        """Contadores de requisições enviadas, enfileiradas, limitadas (429) e repetidas."""
+        with self._lock:
+            return dict(self._counters)
+
+    def _buckets(self, routing_region, method):
+        app = self._app_buckets.get(routing_region)
+        if app is None:
+            app = self._app_buckets[routing_region] = RateLimitBucket(DEFAULT_APP_LIMIT)
+        key = (routing_region, method)
+        method_bucket = self._method_buckets.get(key)
+        if method_bucket is None:
+            method_bucket = self._method_buckets[key] = RateLimitBucket(DEFAULT_METHOD_LIMIT)
+        return app, method_bucket
+
+    def reserve(self, routing_region, method):
+        """Tenta reservar um token nos dois baldes; retorna o tempo de espera (0 = reservado)."""
+        with self._lock:
+            now = time.monotonic()
+            app, method_bucket = self._buckets(routing_region, method)
+            wait = max(app.wait_time(now), method_bucket.wait_time(now))
+            if wait <= 0:
+                app.consume(now)
+                method_bucket.consume(now)
+                self._counters["requests"] += 1
+            return wait
+
+    def acquire(self, routing_region, method):
+        """Bloqueia até a requisição caber nos limites da região e do método."""
+        queued = False
+        while True:
+            wait = self.reserve(routing_region, method)
+            if wait <= 0:
+                return
+            if not queued:
+                queued = True
+                self._count("queued")
+            time.sleep(wait)
+
+    async def acquire_async(self, routing_region, method):
+        """Versão assíncrona de acquire: espera sem bloquear o event loop."""
+        queued = False
+        while True:
+            wait = self.reserve(routing_region, method)
+            if wait <= 0:
+                return
+            if not queued:
+                queued = True
+                self._count("queued")
+            await asyncio.sleep(wait)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def learn(self, routing_region, method, response):
+        """Atualiza os baldes com os cabeçalhos de limite da resposta.
+
+        Retorna quantos segundos esperar antes de tentar de novo quando a
+        resposta foi um 429.
+        """
+        headers = response.headers
+        with self._lock:
+            now = time.monotonic()
+            app, method_bucket = self._buckets(routing_region, method)
+            app.update(headers.get("X-App-Rate-Limit"))
+            app.sync(headers.get("X-App-Rate-Limit-Count"), now)
+            method_bucket.update(headers.get("X-Method-Rate-Limit"))
+            method_bucket.sync(headers.get("X-Method-Rate-Limit-Count"), now)
+            if response.status_code != 429:
+                return 0.0
+            self._counters["throttled"] += 1
+            try:
+                retry_after = float(headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1.0
+            limit_type = headers.get("X-Rate-Limit-Type")
+            if limit_type == "application":
+                app.blocked_until = max(app.blocked_until, now + retry_after)
+            elif limit_type == "method":
+                method_bucket.blocked_until = max(method_bucket.blocked_until, now + retry_after)
+            return retry_after
+
+    def url(self, routing_region, path):
+        return self.base_url.format(routing=routing_region) + path
+
+    def get(self, routing_region, method, path, params=None):
+        """Faz um GET respeitando os limites de taxa, com retentativas internas.
+
+        Retorna a última resposta recebida (o chamador verifica o status).
+        """
+        headers = {"X-Riot-Token": self.api_key or os.getenv("RIOT_API_KEY") or ""}
+        url = self.url(routing_region, path)
+        for attempt in range(self.max_retries + 1):
+            self.acquire(routing_region, method)
+            try:
+                with metrics.timer("riot", metrics.RIOT_DURATION, method):
+                    response = self.session(routing_region).get(url, params=params, headers=headers,
+                                                                timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                # ReadTimeout não é ConnectionError: sem ele, um download lento derrubava a atualização inteira
+                metrics.RIOT_RESPONSES.inc(method, "error")
+                if attempt == self.max_retries:
+                    raise
+                self._count("retried")
+                time.sleep(2 ** attempt)
+                continue
+
+            metrics.RIOT_RESPONSES.inc(method, response.status_code)
+            retry_after = self.learn(routing_region, method, response)
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return response
+            self._count("retried")
+            time.sleep(retry_after or 2 ** attempt)
+
+    async def get_async(self, routing_region, method, path, params=None, max_connections=100):
+        """Versão assíncrona de get (httpx), com os mesmos baldes e contadores."""
+        headers = {"X-Riot-Token": self.api_key or os.getenv("RIOT_API_KEY") or ""}
+        url = self.url(routing_region, path)
+        client = self.async_session(routing_region, max_connections)
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(routing_region, method)
+            try:
+                with metrics.timer("riot", metrics.RIOT_DURATION, method):
+                    response = await client.get(url, params=params, headers=headers)
+            except httpx.TransportError:
+                metrics.RIOT_RESPONSES.inc(method, "error")
+                if attempt == self.max_retries:
+                    raise
+                self._count("retried")
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            metrics.RIOT_RESPONSES.inc(method, response.status_code)
+            retry_after = self.learn(routing_region, method, response)
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return response
+            self._count("retried")
+            await asyncio.sleep(retry_after or 2 ** attempt)
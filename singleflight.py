@@ -0,0 +1,51 @@
+# singleflight.py
+
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Junta chamadas simultâneas de mesma chave numa única execução.
+
+    Quem chega enquanto a chamada está em andamento espera e recebe o mesmo
+    resultado; depois de pronta, o resultado ainda é reaproveitado por `ttl`
+    segundos, absorvendo rajadas de pedidos repetidos. Exceções são repassadas
+    a quem esperava, mas não ficam guardadas.
+    """
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = {}
+
+    def run(self, key, function):
+        """Retorna (resultado, shared), com shared=True se o resultado veio de outra chamada."""
+        with self._lock:
+            now = time.monotonic()
+            for expired in [k for k, (expires, _) in self._results.items() if expires <= now]:
+                del self._results[expired]
+            cached = self._results.get(key)
+            if cached is not None:
+                return cached[1], True
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result(), True
+
+        try:
+            result = function()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            if self.ttl > 0:
+                self._results[key] = (time.monotonic() + self.ttl, result)
+        future.set_result(result)
+        return result, False
@@ -0,0 +1,86 @@
+# timeline.py
+
+"""
+Curvas por minuto (ouro, xp e CS) da timeline de uma partida (match-v5 /timeline).
+
+Da timeline só interessam os quadros do jogador buscado. Cada série vira um
+array de inteiros de 32 bits e as três, concatenadas e comprimidas com zlib,
+ocupam um único BLOB em match_timelines (algumas centenas de bytes por
+partida, contra centenas de KB do JSON da timeline).
+"""
+
+import sys
+import zlib
+from array import array
+
+SERIES = ("gold", "xp", "cs")
+
+
+def player_series(timeline, puuid):
+    """Extrai do payload da timeline as séries do jogador.
+
+    Retorna (frame_interval em ms, {série: lista por quadro}), ou None se o
+    jogador não estiver na partida.
+    """
+    info = timeline.get("info", {})
+    participant_id = None
+    for participant in info.get("participants", []):
+        if participant.get("puuid") == puuid:
+            participant_id = participant.get("participantId")
+            break
+    if participant_id is None:
+        # Formato antigo: só metadata.participants, na ordem dos participantId
+        puuids = timeline.get("metadata", {}).get("participants", [])
+        if puuid not in puuids:
+            return None
+        participant_id = puuids.index(puuid) + 1
+
+    series = {name: [] for name in SERIES}
+    for frame in info.get("frames", []):
+        stats = frame.get("participantFrames", {}).get(str(participant_id))
+        if stats is None:
+            continue
+        series["gold"].append(stats.get("totalGold", 0))
+        series["xp"].append(stats.get("xp", 0))
+        series["cs"].append(stats.get("minionsKilled", 0) + stats.get("jungleMinionsKilled", 0))
+    return info.get("frameInterval", 60000), series
+
+
+def pack_series(series):
+    """Empacota as séries (mesmo tamanho) num BLOB: int32 little-endian, série após série, comprimido."""
+    packed = array("i")
+    for name in SERIES:
+        packed.extend(series[name])
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return zlib.compress(packed.tobytes())
+
+
+def unpack_series(blob, minutes):
+    """Desfaz pack_series: {série: array de `minutes` inteiros}."""
+    packed = array("i")
+    packed.frombytes(zlib.decompress(blob))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return {name: packed[i * minutes:(i + 1) * minutes] for i, name in enumerate(SERIES)}
+
+
+def average_curves(timelines):
+    """Curva média por quadro das partidas; samples[i] diz quantas partidas chegaram ao quadro i.
+
+    timelines são dicts de unpack_series (partidas de durações diferentes).
+    """
+    length = max((len(series["gold"]) for series in timelines), default=0)
+    samples = [0] * length
+    totals = {name: [0] * length for name in SERIES}
+    for series in timelines:
+        for i in range(len(series["gold"])):
+            samples[i] += 1
+        for name in SERIES:
+            column = totals[name]
+            for i, value in enumerate(series[name]):
+                column[i] += value
+    result = {"samples": samples}
+    for name in SERIES:
+        result[name] = [round(total / count, 1) for total, count in zip(totals[name], samples)]
+    return result
@@ -0,0 +1,103 @@
+# write_queue.py
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Fila de escrita (write-behind) drenada por uma única thread escritora.
+
+    Gravações de atualizações simultâneas entram na fila e a thread junta
+    várias numa só transação (group commit): espera até max_delay segundos
+    por mais pedidos ou até somar max_rows linhas, grava tudo e faz um único
+    commit. Cada pedido recebe um Future, resolvido depois do commit, então
+    quem espera pelo resultado já lê o que gravou.
+    """
+
+    def __init__(self, pool, max_rows=5000, max_delay=0.002):
+        self.pool = pool
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Grava o que ainda estiver na fila e encerra a thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, write, rows=1):
+        """Enfileira write(conn), que grava sem commit. Retorna o Future com o retorno de write."""
+        future = Future()
+        if self._thread is None:
+            future.set_exception(RuntimeError("A fila de escrita não está em execução"))
+            return future
+        self._queue.put((write, rows, future))
+        return future
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch, rows = [item], item[1]
+        deadline = time.monotonic() + self.max_delay
+        while rows < self.max_rows:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            rows += item[1]
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        results = []
+        try:
+            with self.pool.writer() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for write, rows, future in batch:
+                    # Um savepoint por pedido: a falha de um não desfaz os outros do lote
+                    conn.execute("SAVEPOINT write_request")
+                    try:
+                        results.append((future, write(conn), None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_request")
+                        results.append((future, None, e))
+                    conn.execute("RELEASE write_request")
+                conn.commit()
+        except Exception as e:
+            logger.exception("Erro ao gravar o lote de escrita")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        metrics.SQLITE_WRITE_BATCH.observe(sum(rows for _, rows, _ in batch))
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
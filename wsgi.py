@@ -0,0 +1,14 @@
+# wsgi.py
+
+"""
+Ponto de entrada WSGI para produção, com vários workers:
+
+    gunicorn -w 4 --threads 8 -b 0.0.0.0:5000 wsgi:app
+
+Cada worker cria o seu app (pool do banco, workers de jobs) uma única vez na
+inicialização; o schema é verificado nesse momento.
+"""
+
+from app import create_app
+
+app = create_app()